@@ -1,10 +1,14 @@
 import argparse
+import hashlib
+import json
 import os
 import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy.fft import fft, fftfreq
+from scipy.fft import fft, fftfreq, rfft
 from scipy.optimize import curve_fit
 from scipy.signal import find_peaks
 
@@ -19,14 +23,105 @@ lever_length = 1e-6
 lever_err = 0.1e-6
 bead_err = 0.05 * bead_radius
 
+SPECTROGRAM_WINDOW_SEC = 8.0
+SPECTROGRAM_HOP_SEC = 0.5
+TRACK_CHUNK_FRAMES = 1 << 16
+# Parsed .txt tables, so re-running analysis skips np.loadtxt
+TABLE_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".dynabeads", "tables")
+# Per-track results kept next to the tracking output between runs
+RESULTS_STORE_NAME = "analysis_results.json"
+# Reports track.py writes next to the track tables that aren't tracks:
+# threshold sweeps (--sweep) and long-video segment manifests
+NON_TRACK_SUFFIXES = ("threshold_sweep.txt", "_long_video_manifest.txt")
+# Bootstrap: each resample analyzes a random window of this fraction of a track
+BOOTSTRAP_WINDOW_FRACTION = 0.8
+BOOTSTRAP_BLOCK = 256
+# Shortest track (and resampling window) the bootstrap will use
+BOOTSTRAP_MIN_FRAMES = 8
+
 LONG_VIDEO_SEGMENT_RE = re.compile(
-    r"_(?P<index>\d{2})_(?:(?P<freq>\d+(?:\.\d+)?)Hz_precess|hold)\.txt$"
+    r"_(?P<index>\d{2})_(?:(?P<freq>\d+(?:\.\d+)?)Hz_precess|hold)\.(?:txt|npz)$"
 )
 
 
-def load_data(data_dir):
-    files = sorted(f for f in os.listdir(data_dir) if f.endswith(".txt"))
-    return [np.loadtxt(os.path.join(data_dir, f), skiprows=1) for f in files], files
+def load_npz_table(path):
+    """Binary track from track.py --npz, as the same columns as the .txt table."""
+    with np.load(path) as track:
+        return np.column_stack(
+            [track["frame"], track["x"], track["y"], track["angle"]]
+        ).astype(float)
+
+
+def track_files(data_dir):
+    """
+    Tracking output files in data_dir, one per track: the .npz when
+    track.py wrote one, otherwise the .txt table.
+    """
+    names = os.listdir(data_dir)
+    npz_stems = set()
+    for name in names:
+        if name.endswith(".npz"):
+            with np.load(os.path.join(data_dir, name)) as track:
+                if "angle" in track.files:
+                    npz_stems.add(name[: -len(".npz")])
+    stems = npz_stems | {
+        name[: -len(".txt")]
+        for name in names
+        if name.endswith(".txt") and not name.endswith(NON_TRACK_SUFFIXES)
+    }
+    return [
+        f"{stem}.npz" if stem in npz_stems else f"{stem}.txt"
+        for stem in sorted(stems, key=lambda stem: f"{stem}.txt")
+    ]
+
+
+def table_cache_key(path):
+    stat = os.stat(path)
+    return {
+        "source": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def load_text_table(path, cache_dir=TABLE_CACHE_DIR):
+    """
+    np.loadtxt of a tracking .txt, through a binary copy in cache_dir that is
+    reused until the text file's size or mtime changes. cache_dir=None
+    always parses the text.
+    """
+    if cache_dir is None:
+        return np.loadtxt(path, skiprows=1)
+    key = table_cache_key(path)
+    name = hashlib.sha1(key["source"].encode()).hexdigest()
+    cache_path = os.path.join(cache_dir, f"{name}.npz")
+    try:
+        with np.load(cache_path) as cached:
+            if json.loads(str(cached["key"])) == key:
+                return cached["table"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    table = np.loadtxt(path, skiprows=1)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        partial_path = f"{cache_path}.{os.getpid()}.partial.npz"
+        np.savez(partial_path, table=table, key=json.dumps(key, sort_keys=True))
+        os.replace(partial_path, cache_path)
+    except OSError:
+        pass
+    return table
+
+
+def load_table(path, cache_dir=TABLE_CACHE_DIR):
+    if path.endswith(".npz"):
+        return load_npz_table(path)
+    return load_text_table(path, cache_dir)
+
+
+def load_data(data_dir, cache_dir=TABLE_CACHE_DIR):
+    files = track_files(data_dir)
+    return [load_table(os.path.join(data_dir, f), cache_dir) for f in files], files
 
 
 def preprocess_data(data):
@@ -43,28 +138,211 @@ def calculate_corrected_angles(data):
     return angles
 
 
+def full_spectrum_magnitude(angle_matrix):
+    """
+    |FFT| of each row of a 2-D array of real series, from a single batched
+    real FFT. The negative-frequency half is mirrored in so peak picking
+    sees exactly the layout of the full complex FFT.
+    """
+    n = angle_matrix.shape[1]
+    half = np.abs(rfft(angle_matrix, axis=1, workers=-1))
+    # Bins n//2+1 .. n-1 mirror bins (n+1)//2-1 .. 1
+    return np.concatenate([half, half[:, 1 : (n + 1) // 2][:, ::-1]], axis=1)
+
+
+def candidate_peaks(magnitude):
+    """Local maxima of each row at least a quarter of the row's maximum."""
+    peaks = np.zeros(magnitude.shape, dtype=bool)
+    if magnitude.shape[1] < 3:
+        return peaks
+    middle = magnitude[:, 1:-1]
+    peaks[:, 1:-1] = (middle > magnitude[:, :-2]) & (middle > magnitude[:, 2:])
+    # Two-bin plateaus, which odd-length spectra have at Nyquist, peak on
+    # the first bin like find_peaks
+    if magnitude.shape[1] >= 4:
+        peaks[:, 1:-2] |= (
+            (magnitude[:, 1:-2] > magnitude[:, :-3])
+            & (magnitude[:, 1:-2] == magnitude[:, 2:-1])
+            & (magnitude[:, 2:-1] > magnitude[:, 3:])
+        )
+    peaks &= magnitude >= np.max(magnitude, axis=1, keepdims=True) / 4
+    return peaks
+
+
+def find_spectral_peaks(magnitude, distance=5):
+    """
+    Vectorized equivalent of scipy.signal.find_peaks(row, height=max/4,
+    distance=distance) for every row. Returns a boolean peak mask.
+    """
+    peaks = candidate_peaks(magnitude)
+    # Keep peaks greedily from the highest down, dropping any closer than
+    # `distance` to a kept one. Done in parallel rounds over the candidate
+    # list: an undecided peak that beats every undecided neighbour is kept.
+    rows, cols = np.nonzero(peaks)
+    distance = int(np.ceil(distance))
+    # Ties go to the later bin, as in find_peaks
+    rank = np.empty(len(cols), dtype=np.int64)
+    rank[np.lexsort((cols, magnitude[rows, cols]))] = np.arange(len(cols))
+    near = [
+        (rows[offset:] == rows[:-offset]) & (cols[offset:] - cols[:-offset] < distance)
+        for offset in range(1, distance)
+    ]
+    kept = np.zeros(len(cols), dtype=bool)
+    undecided = np.ones(len(cols), dtype=bool)
+    while undecided.any():
+        best = np.where(undecided, rank, -1)
+        winners = undecided.copy()
+        for offset, close in enumerate(near, start=1):
+            winners[:-offset] &= ~(close & (best[offset:] > best[:-offset]))
+            winners[offset:] &= ~(close & (best[:-offset] > best[offset:]))
+        kept |= winners
+        undecided &= ~winners
+        for offset, close in enumerate(near, start=1):
+            undecided[:-offset] &= ~(close & winners[offset:])
+            undecided[offset:] &= ~(close & winners[:-offset])
+    peaks[rows[~kept], cols[~kept]] = False
+    return peaks
+
+
+def spectrum_peaks(angle_matrix, distance=5):
+    """(|FFT|, peak mask) for each row of an equal-length 2-D array."""
+    n = angle_matrix.shape[1]
+    magnitude = full_spectrum_magnitude(angle_matrix)
+    peaks = find_spectral_peaks(magnitude, distance)
+    # A peak within `distance` of its own mirror image ties with it, and
+    # find_peaks breaks that tie by sort order; redo those rows with it so
+    # the same one wins.
+    near_nyquist = np.abs(2 * np.arange(n) - n) <= int(np.ceil(distance)) - 1
+    redo = candidate_peaks(magnitude)[:, near_nyquist].any(axis=1)
+    for row in np.flatnonzero(redo):
+        magnitude[row] = np.abs(fft(angle_matrix[row]))
+        found, _ = find_peaks(
+            magnitude[row], height=max(magnitude[row]) / 4, distance=distance
+        )
+        peaks[row] = False
+        peaks[row, found] = True
+    return magnitude, peaks
+
+
+def critical_frequencies_batch(angle_matrix, framerate):
+    """
+    Critical frequency of every row of an equal-length 2-D array: the highest
+    peak frequency with more than half the power of the strongest peak, or 0.
+    """
+    freqs = fftfreq(angle_matrix.shape[1], 1 / framerate)
+    magnitude, peaks = spectrum_peaks(angle_matrix)
+    max_power = np.max(np.where(peaks, magnitude, -np.inf), axis=1, keepdims=True)
+    strong = peaks & (magnitude > max_power / 2)
+    crit_freqs = np.max(np.where(strong, freqs, -np.inf), axis=1)
+    return np.where(peaks.any(axis=1), crit_freqs, 0)
+
+
 def frequency_analysis(angle_data, framerate):
-    freqs = fftfreq(len(angle_data), 1 / framerate)
-    fft_data = np.abs(fft(angle_data))
-    peaks, _ = find_peaks(fft_data, height=np.max(fft_data) / 4, distance=5)
-    peak_freqs = freqs[peaks]
-    peak_powers = fft_data[peaks]
-    return peak_freqs, peak_powers
+    angle_data = np.asarray(angle_data, dtype=float)[None, :]
+    freqs = fftfreq(angle_data.shape[1], 1 / framerate)
+    fft_data, peaks = spectrum_peaks(angle_data)
+    peaks = np.flatnonzero(peaks[0])
+    return freqs[peaks], fft_data[0, peaks]
 
 
 def analyze_data(angles, framerate):
-    crit_freqs = []
-    for angle_data in angles:
-        freqs, powers = frequency_analysis(angle_data, framerate)
-        if len(freqs) > 0:
-            max_power = max(powers)
-            crit_freq = max(f for f, p in zip(freqs, powers) if p > max_power / 2)
-        else:
-            crit_freq = 0
-        crit_freqs.append(crit_freq)
+    """Critical frequency per angle series; equal-length series share one FFT."""
+    crit_freqs = [0] * len(angles)
+    by_length = {}
+    for index, angle_data in enumerate(angles):
+        by_length.setdefault(len(angle_data), []).append(index)
+    for length, indices in by_length.items():
+        if length == 0:
+            continue
+        stacked = np.array([angles[i] for i in indices], dtype=float)
+        for index, crit_freq in zip(
+            indices, critical_frequencies_batch(stacked, framerate)
+        ):
+            crit_freqs[index] = crit_freq
     return crit_freqs
 
 
+def file_fingerprint(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_results_store(data_dir):
+    try:
+        with open(os.path.join(data_dir, RESULTS_STORE_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_results_store(data_dir, store):
+    path = os.path.join(data_dir, RESULTS_STORE_NAME)
+    partial_path = f"{path}.{os.getpid()}.partial"
+    try:
+        with open(partial_path, "w") as f:
+            json.dump(store, f, indent=1, sort_keys=True)
+        os.replace(partial_path, path)
+    except OSError:
+        pass
+
+
+def incremental_crit_freqs(
+    data_dir, files, framerate, section, truncate=False, cache_dir=TABLE_CACHE_DIR,
+    recompute=False,
+):
+    """
+    Critical frequency of each track file, reusing the results store in
+    data_dir for files whose content and analysis settings are unchanged.
+    With truncate every track is cut to the shortest one first (as
+    preprocess_data does), so the shortest length is part of the settings.
+    """
+    store = load_results_store(data_dir)
+    entries = {} if recompute else store.get(section, {})
+    fingerprints = {name: file_fingerprint(os.path.join(data_dir, name)) for name in files}
+    tables = {}
+    lengths = {}
+    for name in files:
+        entry = entries.get(name)
+        if entry is not None and entry["fingerprint"] == fingerprints[name]:
+            lengths[name] = entry["length"]
+        else:
+            tables[name] = load_table(os.path.join(data_dir, name), cache_dir)
+            lengths[name] = len(tables[name])
+
+    settings = {
+        "framerate": framerate,
+        "min_length": min(lengths.values()) if truncate and lengths else None,
+    }
+    stale = [
+        name
+        for name in files
+        if name in tables or entries[name]["settings"] != settings
+    ]
+    if stale:
+        for name in stale:
+            if name not in tables:
+                tables[name] = load_table(os.path.join(data_dir, name), cache_dir)
+        angles = calculate_corrected_angles(
+            [tables[name][: settings["min_length"]] for name in stale]
+        )
+        for name, crit_freq in zip(stale, analyze_data(angles, framerate)):
+            entries[name] = {
+                "fingerprint": fingerprints[name],
+                "length": lengths[name],
+                "settings": settings,
+                "crit_freq_hz": float(crit_freq),
+            }
+    print(f"Analyzed {len(stale)} of {len(files)} tracks ({len(files) - len(stale)} unchanged)")
+
+    # Drop results for tracks that are gone
+    store[section] = {name: entries[name] for name in files}
+    save_results_store(data_dir, store)
+    return [entries[name]["crit_freq_hz"] for name in files]
+
+
 def parse_long_video_filename(filename):
     match = LONG_VIDEO_SEGMENT_RE.search(filename)
     if not match:
@@ -75,11 +353,13 @@ def parse_long_video_filename(filename):
     return segment_index, kind, freq
 
 
-def load_long_video_data(data_dir, framerate):
+def load_long_video_data(
+    data_dir, framerate, cache_dir=TABLE_CACHE_DIR, recompute=False
+):
     """Load precess segments from long-video tracking output."""
     segments = []
-    for filename in sorted(os.listdir(data_dir)):
-        if not filename.endswith(".txt") or filename.endswith("_manifest.txt"):
+    for filename in track_files(data_dir):
+        if filename.endswith("_manifest.txt"):
             continue
         parsed = parse_long_video_filename(filename)
         if parsed is None:
@@ -87,18 +367,23 @@ def load_long_video_data(data_dir, framerate):
         segment_index, kind, driving_freq = parsed
         if kind != "precess":
             continue
-        path = os.path.join(data_dir, filename)
-        data = np.loadtxt(path, skiprows=1)
-        angles = calculate_corrected_angles([data])
-        measured = analyze_data(angles, framerate)[0]
         segments.append(
             {
                 "filename": filename,
                 "segment_index": segment_index,
                 "driving_freq_hz": driving_freq,
-                "measured_freq_hz": measured,
             }
         )
+    crit_freqs = incremental_crit_freqs(
+        data_dir,
+        [segment["filename"] for segment in segments],
+        framerate,
+        "long_video",
+        cache_dir=cache_dir,
+        recompute=recompute,
+    )
+    for segment, measured in zip(segments, crit_freqs):
+        segment["measured_freq_hz"] = measured
     segments.sort(key=lambda s: s["segment_index"])
     return segments
 
@@ -122,6 +407,280 @@ def plot_long_video_frequency_response(segments, output_path=None):
         plt.show()
 
 
+def iter_track_positions(track_path, chunk_frames=TRACK_CHUNK_FRAMES):
+    """
+    Stream the (N, 2) positions of a *_long_video_track.npz in chunks,
+    straight out of the archive, so the whole track is never loaded.
+    """
+    with zipfile.ZipFile(track_path) as archive:
+        with archive.open("positions.npy") as f:
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if fortran_order:
+                yield np.load(track_path)["positions"]
+                return
+            row_bytes = dtype.itemsize * shape[1]
+            remaining = shape[0]
+            while remaining:
+                rows = min(chunk_frames, remaining)
+                chunk = np.frombuffer(f.read(rows * row_bytes), dtype=dtype)
+                yield chunk.reshape(rows, shape[1])
+                remaining -= rows
+
+
+def sliding_spectra(chunks, window, hop):
+    """
+    DFT of every `window`-frame window starting at frame 0, hop, 2*hop, ...
+    of a complex signal given as an iterable of chunks (NaN = no detection).
+
+    Each spectrum is updated from the previous one by the `hop` frames that
+    enter and leave the window (a sliding DFT), so no window is transformed
+    from scratch; only the first window of each chunk is re-seeded with an
+    FFT to keep rounding drift from accumulating over hours of video.
+    Gaps are held at the last detected position. Yields (start_frames,
+    spectra, missing) per chunk, where missing counts the gap frames in each
+    window.
+    """
+    bins = np.arange(window)
+    enter = np.exp(-2j * np.pi * np.outer(np.arange(hop), bins) / window)
+    rotate = np.exp(2j * np.pi * bins * hop / window)
+    buffer = np.empty(0, dtype=complex)
+    gaps = np.empty(0, dtype=bool)
+    last = None
+    start = 0
+    for chunk in chunks:
+        missing = np.isnan(chunk)
+        if missing.all():
+            chunk = np.full(len(chunk), 0j if last is None else last)
+        else:
+            # Hold the last detection across gaps; before the first one,
+            # use the first detection in this chunk
+            valid = np.flatnonzero(~missing)
+            held = np.maximum.accumulate(np.where(missing, 0, np.arange(len(chunk))))
+            chunk = chunk[held]
+            chunk[: valid[0]] = chunk[valid[0]] if last is None else last
+            last = chunk[-1]
+        buffer = np.concatenate([buffer, chunk])
+        gaps = np.concatenate([gaps, missing])
+        if len(buffer) < window:
+            continue
+
+        steps = (len(buffer) - window) // hop
+        spectra = np.empty((steps + 1, window), dtype=complex)
+        spectra[0] = fft(buffer[:window])
+        leaving = buffer[: steps * hop].reshape(steps, hop)
+        entering = buffer[window : window + steps * hop].reshape(steps, hop)
+        gains = (entering - leaving) @ enter
+        for step in range(steps):
+            spectra[step + 1] = rotate * (spectra[step] + gains[step])
+
+        gap_count = np.concatenate([[0], np.cumsum(gaps)])
+        offsets = np.arange(steps + 1) * hop
+        yield (
+            start + offsets,
+            spectra,
+            gap_count[offsets + window] - gap_count[offsets],
+        )
+        buffer = buffer[(steps + 1) * hop :]
+        gaps = gaps[(steps + 1) * hop :]
+        start += (steps + 1) * hop
+
+
+def long_video_spectrogram(
+    track_path,
+    window_sec=SPECTROGRAM_WINDOW_SEC,
+    hop_sec=SPECTROGRAM_HOP_SEC,
+    chunk_frames=TRACK_CHUNK_FRAMES,
+):
+    """
+    Short-time spectrum of the bead's rotation over a whole per-frame track.
+    The position x + iy of a rotating bead is a single spectral line at its
+    signed rotation frequency, so no circle fit or angle unwrapping is needed.
+    """
+    with np.load(track_path) as track:
+        fps = float(track["fps"])
+    window = max(int(round(window_sec * fps)), 4)
+    hop = max(int(round(hop_sec * fps)), 1)
+    freqs = np.fft.fftshift(fftfreq(window, 1 / fps))
+    # DC and its Hann leakage are drift, not rotation
+    rotation_bins = np.abs(freqs) > 1.5 * fps / window
+
+    starts, power, dominant, coverage = [], [], [], []
+    chunks = (
+        positions[:, 0] + 1j * positions[:, 1]
+        for positions in iter_track_positions(track_path, chunk_frames)
+    )
+    for chunk_starts, spectra, missing in sliding_spectra(chunks, window, hop):
+        # Hann window applied in the frequency domain
+        spectra = 0.5 * spectra - 0.25 * (
+            np.roll(spectra, 1, axis=1) + np.roll(spectra, -1, axis=1)
+        )
+        magnitude = np.fft.fftshift(np.abs(spectra), axes=1).astype(np.float32)
+        peak = np.argmax(np.where(rotation_bins, magnitude, -1), axis=1)
+        # Parabolic interpolation on log magnitude for sub-bin frequency
+        rows = np.arange(len(peak))
+        left, centre, right = (
+            np.log(magnitude[rows, np.clip(peak + shift, 0, window - 1)] + 1e-12)
+            for shift in (-1, 0, 1)
+        )
+        curvature = left - 2 * centre + right
+        offset = np.divide(
+            0.5 * (left - right), curvature, out=np.zeros_like(curvature),
+            where=curvature < 0,
+        )
+        starts.append(chunk_starts)
+        power.append(magnitude)
+        dominant.append(freqs[peak] + np.clip(offset, -0.5, 0.5) * fps / window)
+        coverage.append(1 - missing / window)
+
+    if not starts:
+        raise ValueError(f"{track_path} is shorter than one {window_sec:g}s window")
+    starts = np.concatenate(starts)
+    coverage = np.concatenate(coverage)
+    dominant = np.concatenate(dominant)
+    # Mostly-undetected windows have no meaningful peak
+    dominant[coverage < 0.5] = np.nan
+    return {
+        "start_frame": starts,
+        "time_sec": (starts + window / 2) / fps,
+        "frequency_hz": freqs,
+        "power": np.concatenate(power),
+        "dominant_freq_hz": dominant,
+        "coverage": coverage,
+        "fps": fps,
+        "window_frames": window,
+        "hop_frames": hop,
+    }
+
+
+def load_manifest_segments(manifest_path):
+    """Segment lines of a long-video manifest as dicts (skipped segments excluded)."""
+    segments = []
+    with open(manifest_path) as manifest:
+        for line in manifest:
+            fields = dict(field.split("=", 1) for field in line.split())
+            if "kind" not in fields:
+                continue
+            segments.append(
+                {
+                    "segment_index": int(fields["segment"]),
+                    "kind": fields["kind"],
+                    "driving_freq_hz": (
+                        None if fields["freq_hz"] == "None" else float(fields["freq_hz"])
+                    ),
+                    "start_frame": int(fields["start_frame"]),
+                    "end_frame": int(fields["end_frame"]),
+                }
+            )
+    return segments
+
+
+def summarize_spectrogram_segments(spectrogram, segments):
+    """
+    Median |dominant frequency| over the windows lying wholly inside each
+    segment, with its spread, so a drifting lock shows up per segment.
+    """
+    starts = spectrogram["start_frame"]
+    ends = starts + spectrogram["window_frames"]
+    rates = np.abs(spectrogram["dominant_freq_hz"])
+    summaries = []
+    for segment in segments:
+        inside = (starts >= segment["start_frame"]) & (ends <= segment["end_frame"])
+        rates_inside = rates[inside & ~np.isnan(rates)]
+        summary = dict(segment, windows=len(rates_inside))
+        if len(rates_inside):
+            summary["measured_freq_hz"] = float(np.median(rates_inside))
+            summary["spread_hz"] = float(np.std(rates_inside))
+        else:
+            summary["measured_freq_hz"] = np.nan
+            summary["spread_hz"] = np.nan
+        summaries.append(summary)
+    return summaries
+
+
+def plot_long_video_spectrogram(spectrogram, segments, output_path=None):
+    plt.figure(figsize=(12, 6))
+    freqs = spectrogram["frequency_hz"]
+    times = spectrogram["time_sec"]
+    plt.pcolormesh(
+        times,
+        freqs,
+        np.log10(spectrogram["power"].T + 1e-6),
+        shading="nearest",
+        cmap="viridis",
+    )
+    plt.plot(times, spectrogram["dominant_freq_hz"], "w.", markersize=2, label="Dominant")
+    for segment in segments:
+        if segment["kind"] == "precess":
+            start = segment["start_frame"] / spectrogram["fps"]
+            end = segment["end_frame"] / spectrogram["fps"]
+            for drive in (segment["driving_freq_hz"], -segment["driving_freq_hz"]):
+                plt.plot([start, end], [drive, drive], "r--", linewidth=1)
+    plt.xlabel("Time (s)")
+    plt.ylabel("Rotation frequency (Hz)")
+    plt.title("Long video: precession spectrogram")
+    plt.colorbar(label="log10 |X|")
+    plt.legend(loc="upper right")
+    plt.tight_layout()
+    if output_path:
+        plt.savefig(output_path)
+    else:
+        plt.show()
+
+
+def run_spectrogram_analysis(
+    data_dir,
+    window_sec=SPECTROGRAM_WINDOW_SEC,
+    hop_sec=SPECTROGRAM_HOP_SEC,
+    plot_path=None,
+):
+    track_names = sorted(
+        name for name in os.listdir(data_dir) if name.endswith("_long_video_track.npz")
+    )
+    if not track_names:
+        raise SystemExit(
+            f"No per-frame track found in {data_dir}. "
+            "Expected *_long_video_track.npz from track.py --long-video"
+        )
+
+    for track_name in track_names:
+        base_name = track_name[: -len("_long_video_track.npz")]
+        spectrogram = long_video_spectrogram(
+            os.path.join(data_dir, track_name), window_sec, hop_sec
+        )
+        output_path = os.path.join(data_dir, f"{base_name}_spectrogram.npz")
+        np.savez(output_path, **spectrogram)
+        print(f"Wrote spectrogram to {output_path}")
+
+        manifest_path = os.path.join(data_dir, f"{base_name}_long_video_manifest.txt")
+        segments = []
+        if os.path.exists(manifest_path):
+            segments = load_manifest_segments(manifest_path)
+            summaries = summarize_spectrogram_segments(spectrogram, segments)
+            print(
+                f"{'Segment':>8} {'Kind':>8} {'Drive (Hz)':>12} "
+                f"{'Measured (Hz)':>14} {'Spread (Hz)':>12} {'Windows':>8}"
+            )
+            for seg in summaries:
+                drive = seg["driving_freq_hz"]
+                print(
+                    f"{seg['segment_index']:8d} {seg['kind']:>8} "
+                    f"{'-' if drive is None else f'{drive:g}':>12} "
+                    f"{seg['measured_freq_hz']:14g} "
+                    f"{seg['spread_hz']:12g} {seg['windows']:8d}"
+                )
+
+        if plot_path and len(track_names) > 1:
+            root, ext = os.path.splitext(plot_path)
+            path = f"{root}_{base_name}{ext}"
+        else:
+            path = plot_path
+        plot_long_video_spectrogram(spectrogram, segments, output_path=path)
+
+
 def calculate_magnetic_moment(crit_freqs, lever_length, field_strengths, viscosity, bead_radius, munot):
     mag_moments = []
     for crit_freq, field_strength in zip(crit_freqs, field_strengths):
@@ -177,18 +736,155 @@ def plot_magnetic_moments(field_strengths, mag_moments, errors, output_path=None
         plt.show()
 
 
-def run_batch_analysis(data_dir, framerate):
-    data, _ = load_data(data_dir)
-    standardized_data = preprocess_data(data)
-    angles = calculate_corrected_angles(standardized_data)
-    crit_freqs = [analyze_data([angle], framerate)[0] for angle in angles]
+def bootstrap_crit_freqs(angle_data, framerate, resamples, seed, window_fraction):
+    """
+    Critical frequencies of `resamples` random contiguous windows of one
+    angle series, all windows in a single batched FFT.
+    """
+    rng = np.random.default_rng(seed)
+    window = max(int(len(angle_data) * window_fraction), BOOTSTRAP_MIN_FRAMES)
+    starts = rng.integers(0, len(angle_data) - window + 1, size=resamples)
+    windows = np.asarray(angle_data)[starts[:, None] + np.arange(window)]
+    return critical_frequencies_batch(windows, framerate)
+
+
+def bootstrap_magnetic_moments(
+    angles,
+    framerate,
+    resamples,
+    seed=0,
+    window_fraction=BOOTSTRAP_WINDOW_FRACTION,
+    field_strengths=fieldstrength,
+    workers=None,
+):
+    """
+    Bootstrap distributions of each bead's critical frequency and magnetic
+    moment and of the moment-vs-field slope. Track windows are resampled
+    per bead; lever length and bead radius are drawn once per resample and
+    shared by every bead, since they are the same constants for all of them.
+    Work is split into blocks over a process pool, each with its own child
+    of SeedSequence(seed), so results don't depend on the worker count.
+    Beads with tracks shorter than BOOTSTRAP_MIN_FRAMES are skipped (their
+    samples are NaN), and the slope is None unless two or more beads remain.
+    """
+    bead_seeds = np.random.SeedSequence(seed).spawn(len(angles) + 1)
+    block_sizes = [
+        min(BOOTSTRAP_BLOCK, resamples - start) for start in range(0, resamples, BOOTSTRAP_BLOCK)
+    ]
+    crit_samples = np.full((len(angles), resamples), np.nan)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for bead, angle_data in enumerate(angles):
+            if len(angle_data) < BOOTSTRAP_MIN_FRAMES:
+                print(
+                    f"Bead {bead}: track has {len(angle_data)} frames, fewer than "
+                    f"{BOOTSTRAP_MIN_FRAMES}; skipping it in the bootstrap"
+                )
+                continue
+            for block, (size, block_seed) in enumerate(
+                zip(block_sizes, bead_seeds[bead].spawn(len(block_sizes)))
+            ):
+                future = executor.submit(
+                    bootstrap_crit_freqs,
+                    angle_data,
+                    framerate,
+                    size,
+                    block_seed,
+                    window_fraction,
+                )
+                futures[future] = (bead, block * BOOTSTRAP_BLOCK, size)
+        for future in as_completed(futures):
+            bead, start, size = futures[future]
+            crit_samples[bead, start : start + size] = future.result()
+
+    rng = np.random.default_rng(bead_seeds[-1])
+    lever_samples = rng.normal(lever_length, lever_err, resamples)
+    radius_samples = rng.normal(bead_radius, bead_err, resamples)
+    moments = np.array(
+        calculate_magnetic_moment(
+            crit_samples, lever_samples, field_strengths, viscosity, radius_samples, munot
+        )
+    )
+    sampled = ~np.isnan(moments).any(axis=1)
+    if sampled.sum() >= 2:
+        fields = np.asarray(field_strengths[: len(moments)])
+        slopes = np.polyfit(fields[sampled], moments[sampled], 1)[0]
+    else:
+        slopes = None
+    return {
+        "crit_freq_hz": crit_samples[: len(moments)],
+        "magnetic_moment": moments,
+        "slope": slopes,
+    }
+
+
+def confidence_interval(samples, level=0.95):
+    tail = 50 * (1 - level)
+    return np.percentile(samples, [tail, 100 - tail], axis=-1)
+
+
+def run_batch_analysis(
+    data_dir,
+    framerate,
+    cache_dir=TABLE_CACHE_DIR,
+    recompute=False,
+    bootstrap=0,
+    seed=0,
+):
+    crit_freqs = incremental_crit_freqs(
+        data_dir,
+        track_files(data_dir),
+        framerate,
+        "batch",
+        truncate=True,
+        cache_dir=cache_dir,
+        recompute=recompute,
+    )
     mag_moments = calculate_magnetic_moment(
         crit_freqs, lever_length, fieldstrength, viscosity, bead_radius, munot
     )
-    errors = propagate_errors(
+    propagated = propagate_errors(
         crit_freqs, lever_length, bead_radius, fieldstrength, lever_err, bead_err
     )
-    plot_magnetic_moments(fieldstrength, mag_moments, errors)
+    if bootstrap:
+        data, _ = load_data(data_dir, cache_dir)
+        angles = calculate_corrected_angles(preprocess_data(data))
+        samples = bootstrap_magnetic_moments(angles, framerate, bootstrap, seed)
+        # plot_magnetic_moments plots moments in units of 1e-15 Am², the units
+        # propagate_errors works in. Beads the bootstrap skipped have NaN
+        # samples, which curve_fit can't take as sigma; they keep their
+        # propagated error.
+        plot_errors = [
+            fallback if np.isnan(error) else error * 1e15
+            for error, fallback in zip(
+                np.std(samples["magnetic_moment"], axis=1), propagated
+            )
+        ]
+        errors = [error / 1e15 for error in plot_errors]
+        freq_ci = confidence_interval(samples["crit_freq_hz"])
+        moment_ci = confidence_interval(samples["magnetic_moment"])
+        print(f"Bootstrap: {bootstrap} resamples, seed {seed}, 95% intervals")
+        for bead, (crit_freq, moment) in enumerate(zip(crit_freqs, mag_moments)):
+            if np.isnan(freq_ci[0, bead]):
+                print(
+                    f"Bead {bead}: critical frequency {crit_freq:.3f} Hz "
+                    "(not bootstrapped, propagated error)"
+                )
+                continue
+            print(
+                f"Bead {bead}: critical frequency {crit_freq:.3f} Hz "
+                f"[{freq_ci[0, bead]:.3f}, {freq_ci[1, bead]:.3f}], "
+                f"magnetic moment {moment:.3e} Am² "
+                f"[{moment_ci[0, bead]:.3e}, {moment_ci[1, bead]:.3e}]"
+            )
+        if samples["slope"] is None:
+            print("Slope: needs at least two bootstrapped beads, skipped")
+        else:
+            slope_ci = confidence_interval(samples["slope"])
+            print(f"Slope: [{slope_ci[0]:.3e}, {slope_ci[1]:.3e}] Am²/Oe")
+    else:
+        errors = plot_errors = propagated
+    plot_magnetic_moments(fieldstrength, mag_moments, plot_errors)
     for moment, error in zip(mag_moments, errors):
         print(f"Magnetic Moment: {moment:.3e} Am², Error: {error:.3e} Am²")
 
@@ -205,12 +901,14 @@ def framerate_from_manifest(data_dir):
     return None
 
 
-def run_long_video_analysis(data_dir, framerate, plot_path=None):
+def run_long_video_analysis(
+    data_dir, framerate, plot_path=None, cache_dir=TABLE_CACHE_DIR, recompute=False
+):
     manifest_fps = framerate_from_manifest(data_dir)
     if manifest_fps is not None:
         framerate = manifest_fps
         print(f"Using framerate {framerate:.3f} Hz from long-video manifest")
-    segments = load_long_video_data(data_dir, framerate)
+    segments = load_long_video_data(data_dir, framerate, cache_dir, recompute)
     if not segments:
         raise SystemExit(
             f"No long-video precess segments found in {data_dir}. "
@@ -234,13 +932,30 @@ def main():
         "data_dir",
         nargs="?",
         default=os.getcwd(),
-        help="Directory containing .txt tracking files",
+        help="Directory containing .txt (or .npz) tracking files",
     )
     parser.add_argument(
         "--long-video",
         action="store_true",
         help="Analyze long-video segment exports (precess blocks only)",
     )
+    parser.add_argument(
+        "--spectrogram",
+        action="store_true",
+        help="Sliding-window spectrogram of the whole long-video per-frame track",
+    )
+    parser.add_argument(
+        "--window",
+        type=float,
+        default=SPECTROGRAM_WINDOW_SEC,
+        help=f"Spectrogram window in seconds (default: {SPECTROGRAM_WINDOW_SEC:g})",
+    )
+    parser.add_argument(
+        "--hop",
+        type=float,
+        default=SPECTROGRAM_HOP_SEC,
+        help=f"Spectrogram step between windows in seconds (default: {SPECTROGRAM_HOP_SEC:g})",
+    )
     parser.add_argument(
         "--framerate",
         type=float,
@@ -253,12 +968,53 @@ def main():
         default=None,
         help="Save plot to this path instead of showing interactively",
     )
+    parser.add_argument(
+        "--no-parse-cache",
+        action="store_true",
+        help=f"Always parse .txt tables instead of reusing the copies in {TABLE_CACHE_DIR}",
+    )
+    parser.add_argument(
+        "--recompute",
+        action="store_true",
+        help=f"Ignore per-track results saved in {RESULTS_STORE_NAME} and redo every track",
+    )
+    parser.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Bootstrap N resamples per bead for confidence intervals (batch analysis)",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed for --bootstrap (default: 0)",
+    )
     args = parser.parse_args()
+    cache_dir = None if args.no_parse_cache else TABLE_CACHE_DIR
 
-    if args.long_video:
-        run_long_video_analysis(args.data_dir, args.framerate, plot_path=args.plot)
+    if args.spectrogram:
+        run_spectrogram_analysis(
+            args.data_dir, args.window, args.hop, plot_path=args.plot
+        )
+    elif args.long_video:
+        run_long_video_analysis(
+            args.data_dir,
+            args.framerate,
+            plot_path=args.plot,
+            cache_dir=cache_dir,
+            recompute=args.recompute,
+        )
     else:
-        run_batch_analysis(args.data_dir, args.framerate)
+        run_batch_analysis(
+            args.data_dir,
+            args.framerate,
+            cache_dir=cache_dir,
+            recompute=args.recompute,
+            bootstrap=args.bootstrap,
+            seed=args.seed,
+        )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+# How often the Tk thread drains progress messages from a running job
+POLL_MS = 100
+
+# One run at a time: tracking and cropping share the GUI's progress bar and
+# each already uses every core, so a second run queues behind the first.
+RUN_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+
+class QueuedWindow:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def deiconify(self):
+        self.messages.put(("deiconify", None))
+
+    def withdraw(self):
+        self.messages.put(("withdraw", None))
+
+
+class QueuedProgress:
+    """
+    tqdm-like progress for code running off the Tk thread. Calls are queued
+    and replayed on the real (tqdm.tk) bar by poll(), which only the Tk
+    thread may call.
+    """
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.messages = queue.Queue()
+        self.n = 0
+        self.total = None
+        self._tk_window = QueuedWindow(self.messages)
+
+    def reset(self, total=None):
+        self.n = 0
+        self.total = total
+        self.messages.put(("reset", total))
+
+    def update(self, n=1):
+        self.n += n
+        self.messages.put(("update", n))
+
+    def refresh(self):
+        self.messages.put(("refresh", self.n))
+
+    def poll(self):
+        while True:
+            try:
+                kind, value = self.messages.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                if kind == "reset":
+                    self.progress.reset(total=value)
+                elif kind == "update":
+                    self.progress.update(value)
+                elif kind == "refresh":
+                    self.progress.n = value
+                    self.progress.refresh()
+                elif kind == "deiconify":
+                    self.progress._tk_window.deiconify()
+                elif kind == "withdraw":
+                    self.progress._tk_window.withdraw()
+            except Exception:
+                pass
+
+
+def start(root, fn, progress=None, on_done=None):
+    """
+    Run fn(progress, cancel) on the run executor while Tk stays responsive.
+    fn gets a QueuedProgress over the given bar (or None) and a
+    threading.Event, which is also returned; setting it asks fn to stop.
+    on_done(future, cancelled) is called on the Tk thread once fn returns.
+    """
+    cancel = threading.Event()
+    proxy = QueuedProgress(progress) if progress is not None else None
+    future = RUN_EXECUTOR.submit(fn, proxy, cancel)
+
+    def poll():
+        if proxy is not None:
+            proxy.poll()
+        if not future.done():
+            root.after(POLL_MS, poll)
+            return
+        if proxy is not None and cancel.is_set():
+            # Don't leave a half-full bar on screen
+            try:
+                progress._tk_window.withdraw()
+            except Exception:
+                pass
+        if on_done is not None:
+            on_done(future, cancel.is_set())
+        elif future.exception() is not None:
+            print(f"Run failed: {future.exception()}")
+
+    root.after(POLL_MS, poll)
+    return cancel
@@ -1,9 +1,35 @@
 import os
+import json
+import time
 import track
+import hashlib
+import tempfile
+import fnmatch
 import argparse
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 
 
-def process_folder(input, output):
+# One glob per directory level below the input folder
+DEFAULT_FOLDER_PATTERN = "*/*/*S and R*/*/*Rotation*"
+DISCOVERY_CACHE_PATH = os.path.join(
+    os.path.expanduser("~"), ".dynabeads", "discovery.json"
+)
+# Listing is latency-bound on network mounts, so overlap many at once
+DISCOVERY_WORKERS = 16
+# Completion journal, one JSON record per line, in Bulk Rotation Output
+JOURNAL_NAME = "bulk_journal.jsonl"
+MAX_ATTEMPTS = 3
+# Frames tracked to measure throughput for the dry-run ETA
+CALIBRATION_FRAMES = 200
+
+
+def folder_args(input, output):
     args = dict(
         input=input,
         output=output,
@@ -13,40 +39,378 @@ def process_folder(input, output):
         absolute=False,
         text=True,
     )
-    args = argparse.Namespace(**args)
-    track.process_folder(args, None)
-
-
-def get_folders(input):
-    process_folders = []
-    for folder in os.listdir(input):
-        if os.path.isdir(os.path.join(input, folder)):
-            for subfolder in os.listdir(os.path.join(input, folder)):
-                if os.path.isdir(os.path.join(input, folder, subfolder)):
-                    for subsubfolder in os.listdir(os.path.join(input, folder, subfolder)):
-                        if os.path.isdir(os.path.join(input, folder, subfolder, subsubfolder)):
-                            if "S and R" in subsubfolder:
-                                for subsubsubfolder in os.listdir(os.path.join(input, folder, subfolder, subsubfolder)):
-                                    if os.path.isdir(os.path.join(input, folder, subfolder, subsubfolder, subsubsubfolder)):
-                                        for subsubsubsubfolder in os.listdir(os.path.join(input, folder, subfolder, subsubfolder, subsubsubfolder, subsubsubsubfolder)):
-                                            if os.path.isdir(os.path.join(input, folder, subfolder, subsubfolder, subsubsubfolder, subsubsubsubfolder)):
-                                                if ("Rotation" in subsubsubsubfolder):
-                                                    process_folders.append(
-                                                        os.path.join(folder, subfolder, subsubfolder, subsubsubfolder, subsubsubsubfolder)
-                                                    )
-    return process_folders
-
-
-def process_folders(input, dry_run):
-    for folder in get_folders(input):
-        input = folder
-        name = os.path.basename(folder)
+    return argparse.Namespace(**args)
+
+
+def process_folder(input, output):
+    track.process_folder(folder_args(input, output), None)
+
+
+def load_discovery_cache(cache_path):
+    if cache_path is None:
+        return {}
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_discovery_cache(cache_path, cache):
+    if cache_path is None:
+        return
+    partial_path = f"{cache_path}.{os.getpid()}.partial"
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(partial_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(partial_path, cache_path)
+    except OSError:
+        pass
+
+
+def list_subfolders(path, cache):
+    """
+    (mtime_ns, sorted subfolder names) of path. A directory's mtime changes
+    whenever an entry is added, removed or renamed, so a cached listing with
+    the same mtime is reused without listing the directory again.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+        cached = cache.get(path)
+        if cached is not None and cached["mtime_ns"] == mtime_ns:
+            return mtime_ns, cached["subfolders"]
+        with os.scandir(path) as entries:
+            return mtime_ns, sorted(entry.name for entry in entries if entry.is_dir())
+    except OSError:
+        return None, []
+
+
+def get_folders(
+    input,
+    pattern=DEFAULT_FOLDER_PATTERN,
+    cache_path=DISCOVERY_CACHE_PATH,
+    workers=DISCOVERY_WORKERS,
+):
+    """
+    Folders under input (relative paths) matching pattern, one glob per
+    level, e.g. "*/*/*S and R*/*/*Rotation*". Each level's directories are
+    listed concurrently.
+    """
+    root = os.path.abspath(input)
+    cache = load_discovery_cache(cache_path)
+    listed = {}
+    folders = [""]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for level in pattern.strip("/").split("/"):
+            paths = [os.path.join(root, folder) for folder in folders]
+            listings = executor.map(lambda path: list_subfolders(path, cache), paths)
+            matched = []
+            for folder, path, (mtime_ns, subfolders) in zip(folders, paths, listings):
+                if mtime_ns is not None:
+                    listed[path] = {"mtime_ns": mtime_ns, "subfolders": subfolders}
+                matched.extend(
+                    os.path.join(folder, subfolder)
+                    for subfolder in subfolders
+                    if fnmatch.fnmatchcase(subfolder, level)
+                )
+            folders = matched
+
+    # Replace this tree's entries so deleted folders don't linger
+    prefix = os.path.join(root, "")
+    cache = {
+        path: entry
+        for path, entry in cache.items()
+        if path != root and not path.startswith(prefix)
+    }
+    cache.update(listed)
+    save_discovery_cache(cache_path, cache)
+    return folders
+
+
+def collect_jobs(input, folders):
+    """
+    (num, video_file, args) for every video in every folder. num counts
+    within each folder, as track.process_folder numbers them, and args
+    routes each video's output to its folder under Bulk Rotation Output.
+    """
+    jobs = []
+    for folder in folders:
         output = os.path.join(input, "Bulk Rotation Output", folder)
-        if not dry_run:
-            os.makedirs(output, exist_ok=True)
-            process_folder(os.path.join(input, folder), output)
+        args = folder_args(os.path.join(input, folder), output)
+        for num, video_file in enumerate(track.list_videos(args.input)):
+            jobs.append((num, video_file, args))
+    return jobs
+
+
+def job_key(video_file, args):
+    """A video's identity plus every tracking parameter except its input folder."""
+    stat = os.stat(video_file)
+    key = {
+        "video": os.path.abspath(video_file),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "params": {name: value for name, value in vars(args).items() if name != "input"},
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def job_outputs(video_file, args):
+    """Output files a tracked video left in its output folder."""
+    name = os.path.splitext(os.path.basename(video_file))[0]
+    candidates = [f"{name}.txt", f"{name}_plot.png", f"{name}.npz", f"{name}_debug.mp4"]
+    paths = [os.path.join(args.output, candidate) for candidate in candidates]
+    return [path for path in paths if os.path.exists(path)]
+
+
+def read_journal(journal_path):
+    """(done records by key, failure counts by key) from the journal."""
+    done = {}
+    failures = {}
+    try:
+        with open(journal_path) as journal:
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A line torn by a crash mid-write
+                    continue
+                if record["status"] == "done":
+                    done[record["key"]] = record
+                else:
+                    failures[record["key"]] = failures.get(record["key"], 0) + 1
+    except FileNotFoundError:
+        pass
+    return done, failures
+
+
+def plan_jobs(jobs, journal_path, max_attempts=MAX_ATTEMPTS):
+    """
+    Split jobs by the journal into (pending, done, given_up). pending holds
+    (key, attempts_so_far, job). A finished job whose outputs have since
+    been deleted is pending again.
+    """
+    done, failures = read_journal(journal_path)
+    pending, finished, given_up = [], [], []
+    for job in jobs:
+        num, video_file, args = job
+        key = job_key(video_file, args)
+        record = done.get(key)
+        if record is not None and all(os.path.exists(p) for p in record["outputs"]):
+            finished.append(job)
+        elif failures.get(key, 0) >= max_attempts:
+            given_up.append(job)
         else:
+            pending.append((key, failures.get(key, 0), job))
+    return pending, finished, given_up
+
+
+def read_metadata(video_files, workers=DISCOVERY_WORKERS):
+    """
+    track.video_metadata of each video (container only, no decoding), read
+    concurrently since opening files is latency-bound on network mounts.
+    None for a video that can't be opened.
+    """
+
+    def read(video_file):
+        try:
+            return track.video_metadata(video_file)
+        except ValueError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(read, video_files))
+
+
+def job_frames(metadata):
+    return metadata["frame_count"] if metadata else 0
+
+
+def job_pixels(metadata):
+    """Frames x pixels per frame, which tracking time scales with."""
+    if not metadata:
+        return 0
+    return metadata["frame_count"] * metadata["width"] * metadata["height"]
+
+
+def calibrate(video_file, args, frames=CALIBRATION_FRAMES):
+    """
+    (pixels tracked per second, seconds to export one video) for one
+    worker, timed on the start of one video with output to a scratch folder.
+    """
+    metadata = track.video_metadata(video_file)
+    with tempfile.TemporaryDirectory() as output:
+        calibration_args = argparse.Namespace(**dict(vars(args), output=output))
+        start = time.perf_counter()
+        video_path, centers, video_dims = track.process(
+            video_file, calibration_args, 0, frames
+        )
+        tracked = time.perf_counter()
+        track.export_video(0, video_path, centers, video_dims, calibration_args)
+        exported = time.perf_counter()
+    frame_pixels = min(frames, metadata["frame_count"]) * metadata["width"] * metadata["height"]
+    return frame_pixels / max(tracked - start, 1e-6), exported - tracked
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m {seconds:02d}s"
+    return f"{minutes}m {seconds:02d}s"
+
+
+def estimate_jobs(pending, workers=None):
+    """
+    Print frame totals and a wall-clock ETA per folder and in total for the
+    pending jobs, from container metadata and a short calibration run.
+    """
+    if not pending:
+        return
+    workers = workers or os.cpu_count() or 1
+    jobs = [job for _, _, job in pending]
+    metadata = read_metadata([video_file for _, video_file, _ in jobs])
+    readable = [job for job, meta in zip(jobs, metadata) if meta]
+    if not readable:
+        print("No readable videos to estimate.")
+        return
+    _, video_file, args = readable[0]
+    pixel_rate, export_seconds = calibrate(video_file, args)
+    print(
+        f"Calibration: {pixel_rate / 1e6:.1f} Mpx/s and {export_seconds:.2f}s export "
+        f"per video per worker on {os.path.basename(video_file)}, {workers} workers"
+    )
+
+    folders = {}
+    for (_, video_file, args), meta in zip(jobs, metadata):
+        folder = folders.setdefault(args.input, {"videos": 0, "frames": 0, "seconds": 0.0})
+        folder["videos"] += 1
+        folder["frames"] += job_frames(meta)
+        folder["seconds"] += job_pixels(meta) / pixel_rate + export_seconds
+        if meta is None:
+            print(f"  Could not read {video_file}")
+    for input, folder in folders.items():
+        print(
+            f"{input}: {folder['videos']} videos, {folder['frames']} frames, "
+            f"~{format_duration(folder['seconds'] / workers)}"
+        )
+    total_seconds = sum(folder["seconds"] for folder in folders.values())
+    longest = max(job_pixels(meta) for meta in metadata) / pixel_rate + export_seconds
+    print(
+        f"Total: {len(jobs)} videos, "
+        f"{sum(folder['frames'] for folder in folders.values())} frames, "
+        f"ETA ~{format_duration(max(total_seconds / workers, longest))}"
+    )
+
+
+def run_jobs(jobs, journal_path, max_attempts=MAX_ATTEMPTS):
+    """
+    Track every job on one worker pool shared by all folders. Each result is
+    appended to the journal as it lands, so a rerun resumes where this one
+    stopped; failures are retried up to max_attempts over all runs.
+    """
+    from tqdm import tqdm
+
+    pending, finished, given_up = plan_jobs(jobs, journal_path, max_attempts)
+    print(
+        f"{len(finished)} videos already tracked, {len(pending)} to track, "
+        f"{len(given_up)} skipped after {max_attempts} failed attempts"
+    )
+    for output in {args.output for _, _, (_, _, args) in pending}:
+        os.makedirs(output, exist_ok=True)
+    os.makedirs(os.path.dirname(journal_path), exist_ok=True)
+
+    # Progress counts frames, so its rate and remaining time mean something
+    # when videos differ in length
+    frames = dict(
+        zip(
+            (key for key, _, _ in pending),
+            map(job_frames, read_metadata([job[1] for _, _, job in pending])),
+        )
+    )
+    failed = []
+    progress = tqdm(
+        total=sum(frames.values()), desc="Bulk Progress", unit="frame", unit_scale=True
+    )
+    # Only a couple of jobs per worker are handed to the pool at a time, so
+    # waiting on the running ones stays cheap over thousands of videos
+    queued = deque(pending)
+    max_in_flight = 2 * (os.cpu_count() or 1)
+    with ProcessPoolExecutor() as executor, open(journal_path, "a") as journal:
+        future_to_job = {}
+
+        def record_result(future, key, attempts, job):
+            num, video_file, args = job
+            record = {
+                "key": key,
+                "video": os.path.abspath(video_file),
+                "output": args.output,
+                "threshold": args.threshold,
+                "attempt": attempts,
+                "time": time.time(),
+            }
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"{video_file} generated an exception: {exc}")
+                record.update(status="failed", error=str(exc))
+                if attempts < max_attempts:
+                    queued.append((key, attempts, job))
+                else:
+                    failed.append(video_file)
+                    progress.update(frames[key])
+            else:
+                record.update(status="done", outputs=job_outputs(video_file, args))
+                progress.update(frames[key])
+            journal.write(json.dumps(record) + "\n")
+            journal.flush()
+
+        def fill():
+            while queued and len(future_to_job) < max_in_flight:
+                key, attempts, job = queued.popleft()
+                num, video_file, args = job
+                future = executor.submit(track.process_video, num, video_file, args)
+                future_to_job[future] = (key, attempts + 1, job)
+
+        fill()
+        while future_to_job:
+            done, _ = wait(future_to_job, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, attempts, job = future_to_job.pop(future)
+                record_result(future, key, attempts, job)
+            fill()
+
+    progress.close()
+
+    if failed or given_up:
+        print(f"{len(failed) + len(given_up)} videos left after {max_attempts} attempts:")
+        for video_file in failed + [video_file for _, video_file, _ in given_up]:
+            print(f"  {video_file}")
+
+
+def process_folders(
+    input,
+    dry_run,
+    pattern=DEFAULT_FOLDER_PATTERN,
+    cache_path=DISCOVERY_CACHE_PATH,
+    max_attempts=MAX_ATTEMPTS,
+):
+    folders = get_folders(input, pattern, cache_path)
+    journal_path = os.path.join(input, "Bulk Rotation Output", JOURNAL_NAME)
+    if dry_run:
+        for folder in folders:
+            output = os.path.join(input, "Bulk Rotation Output", folder)
             print(f"Dry run: {folder} -> {output}")
+        pending, finished, given_up = plan_jobs(
+            collect_jobs(input, folders), journal_path, max_attempts
+        )
+        print(
+            f"Dry run: {len(finished)} videos already tracked, {len(pending)} to track, "
+            f"{len(given_up)} skipped after {max_attempts} failed attempts"
+        )
+        estimate_jobs(pending)
+        return
+    run_jobs(collect_jobs(input, folders), journal_path, max_attempts)
 
 
 if "__main__" == __name__:
@@ -59,10 +423,30 @@ if "__main__" == __name__:
         action="store_true",
         help="Dry run",
     )
+    parser.add_argument(
+        "-p",
+        "--pattern",
+        default=DEFAULT_FOLDER_PATTERN,
+        help=f'Folder glob per level below the input (default: "{DEFAULT_FOLDER_PATTERN}")',
+    )
+    parser.add_argument(
+        "--no-discovery-cache",
+        action="store_true",
+        help=f"List every folder instead of reusing listings cached in {DISCOVERY_CACHE_PATH}",
+    )
+    parser.add_argument(
+        "--max-attempts",
+        type=int,
+        default=MAX_ATTEMPTS,
+        help=f"Attempts per video across runs before giving up (default: {MAX_ATTEMPTS})",
+    )
     parser.add_argument(
         "input",
         type=str,
         help="Path to input folder",
     )
     args = parser.parse_args()
-    process_folders(args.input, args.dry_run)
\ No newline at end of file
+    cache_path = None if args.no_discovery_cache else DISCOVERY_CACHE_PATH
+    process_folders(
+        args.input, args.dry_run, args.pattern, cache_path, args.max_attempts
+    )
\ No newline at end of file
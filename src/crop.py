@@ -1,12 +1,24 @@
 import os
 import sys
 import cv2
+import queue
+import track
 import argparse
+import threading
+import background
+import framecache
 import numpy as np
 import tkinter as tk
 from PIL import Image, ImageTk
 from tkinter import filedialog, simpledialog, ttk
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+
+# Frames buffered per bead writer before decoding waits for it
+EXPORT_QUEUE_DEPTH = 32
+# Videos whose size and first-frame thumbnail the explorer keeps
+VIDEO_INFO_CACHE_SIZE = 64
 
 
 # Define a function to get sorted list of video files
@@ -22,29 +34,29 @@ def get_first_frame(video_path, target_width=960, target_height=540):
     success, frame = cap.read()
     cap.release()
     if success:
-        # Convert to RGB for PIL
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        return fit_frame(frame, target_width, target_height)
 
-        # Get original frame size
-        orig_height, orig_width = frame.shape[:2]
+    return None
 
-        # Calculate the scaling factor to fit the frame within the target size, maintaining aspect ratio
-        scale_w = target_width / orig_width
-        scale_h = target_height / orig_height
-        scale = min(scale_w, scale_h)
 
-        # Calculate the new size
-        new_width = int(orig_width * scale)
-        new_height = int(orig_height * scale)
+def fit_frame(frame, target_width=960, target_height=540):
+    # Convert to RGB for PIL
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
-        # Resize the frame
-        resized_frame = cv2.resize(
-            frame, (new_width, new_height), interpolation=cv2.INTER_AREA
-        )
+    # Get original frame size
+    orig_height, orig_width = frame.shape[:2]
 
-        return resized_frame
+    # Calculate the scaling factor to fit the frame within the target size, maintaining aspect ratio
+    scale_w = target_width / orig_width
+    scale_h = target_height / orig_height
+    scale = min(scale_w, scale_h)
 
-    return None
+    # Calculate the new size
+    new_width = int(orig_width * scale)
+    new_height = int(orig_height * scale)
+
+    # Resize the frame
+    return cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
 
 
 # Assuming you have a method to get the frame size
@@ -58,6 +70,94 @@ def get_frame_size(video_path):
     return None, None
 
 
+class VideoInfoCache:
+    """
+    LRU of each video's frame size and scaled first frame, so navigating the
+    explorer doesn't reopen videos. Neighbouring videos can be prefetched in
+    the background; asking for one still loading waits for that load.
+    """
+
+    def __init__(self, maxsize=VIDEO_INFO_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=2)
+
+    def load(self, video_path):
+        # Raise rather than return a blank entry, so failures aren't cached
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise ValueError(f"Could not open {video_path}")
+        size = (
+            int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        )
+        success, frame = cap.read()
+        cap.release()
+        if not success:
+            raise ValueError(f"Could not read a frame from {video_path}")
+        thumbnail = fit_frame(frame)
+        # Shared between callers, so keep anyone from drawing on it
+        thumbnail.flags.writeable = False
+        return size, thumbnail
+
+    def add(self, video_path, future):
+        self.entries[video_path] = future
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def get(self, video_path):
+        with self.lock:
+            future = self.entries.get(video_path)
+            loading = future is None
+            if loading:
+                future = Future()
+                self.add(video_path, future)
+            else:
+                self.entries.move_to_end(video_path)
+        if loading:
+            try:
+                future.set_result(self.load(video_path))
+            except Exception as e:
+                future.set_exception(e)
+                self.forget_failure(video_path, future)
+        return future.result()
+
+    def forget_failure(self, video_path, future):
+        # Don't remember failed loads; the next visit tries the video again
+        if future.exception() is None:
+            return
+        with self.lock:
+            if self.entries.get(video_path) is future:
+                del self.entries[video_path]
+
+    def prefetch(self, video_paths):
+        submitted = []
+        with self.lock:
+            for video_path in video_paths:
+                if video_path not in self.entries:
+                    future = self.executor.submit(self.load, video_path)
+                    self.add(video_path, future)
+                    submitted.append((video_path, future))
+        # Outside the lock: a callback on a finished future runs right away
+        for video_path, future in submitted:
+            future.add_done_callback(
+                lambda done, video_path=video_path: self.forget_failure(video_path, done)
+            )
+
+    def frame_size(self, video_path):
+        try:
+            return self.get(video_path)[0]
+        except ValueError:
+            return None, None
+
+    def first_frame(self, video_path):
+        try:
+            return self.get(video_path)[1]
+        except ValueError:
+            return None
+
+
 def detect_beads(frame):
     """Detect the centers of beads in a frame."""
     gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
@@ -71,7 +171,48 @@ def detect_beads(frame):
     return centers
 
 
-def export_selected_beads(input, output, video_path, selections):
+class BeadWriter:
+    """
+    Feeds one bead's writer (cv2.VideoWriter or FrameStackWriter) from its
+    own thread through a bounded queue, so encoding overlaps decoding and
+    the other beads' encoders.
+    """
+
+    def __init__(self, writer, depth=EXPORT_QUEUE_DEPTH):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=depth)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                return
+            if self.error is None:
+                try:
+                    self.writer.write(frame)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, frame):
+        self.queue.put(frame)
+
+    def release(self):
+        self.queue.put(None)
+        self.thread.join()
+        self.writer.release()
+        if self.error is not None:
+            raise self.error
+
+
+def export_selected_beads(input, output, video_path, selections, lossless=False):
+    """
+    Crop a 100x100 window around each selected bead into output/bead_i, as
+    an mp4v video or, with lossless, a grayscale frame stack (.npy plus
+    .json) that the tracker reads without decoding.
+    """
     if not os.path.exists(video_path):
         raise FileNotFoundError(f"{video_path} does not exist.")
 
@@ -81,6 +222,10 @@ def export_selected_beads(input, output, video_path, selections):
 
     fps = cap.get(cv2.CAP_PROP_FPS)
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    frame_shape = (
+        int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+    )
     fourcc = cv2.VideoWriter_fourcc(*"mp4v")
 
     os.makedirs(output, exist_ok=True)
@@ -89,28 +234,53 @@ def export_selected_beads(input, output, video_path, selections):
     for i, selected in enumerate(selections):
         i += 1
         if selected:
-            cx, cy = selected
+            window = track.bead_window(selected, frame_shape)
             out_dir = os.path.join(output, f"bead_{i}")
             os.makedirs(out_dir, exist_ok=True)
             out_path = os.path.join(out_dir, os.path.basename(video_path))
-            writers.append(
-                (cv2.VideoWriter(out_path, fourcc, fps, (100, 100)), (cx, cy))
-            )
+            if lossless:
+                x1, y1, x2, y2 = window
+                writer = framecache.FrameStackWriter(
+                    os.path.splitext(out_path)[0] + ".npy",
+                    total_frames,
+                    (x2 - x1, y2 - y1),
+                    {"source": os.path.abspath(video_path), "fps": fps, "window": window},
+                )
+            else:
+                writer = cv2.VideoWriter(out_path, fourcc, fps, (100, 100))
+            writers.append((BeadWriter(writer), window))
+
+    try:
+        for i in range(total_frames):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            for writer, (x1, y1, x2, y2) in writers:
+                writer.write(frame[y1:y2, x1:x2].copy())
+    finally:
+        cap.release()
+        for writer, _ in writers:
+            writer.release()
 
-    for i in range(total_frames):
-        ret, frame = cap.read()
-        if not ret:
-            break
-        for writer, (cx, cy) in writers:
-            y1 = max(0, cy - 50)
-            y2 = min(cy + 50, frame.shape[0])
-            x1 = max(0, cx - 50)
-            x2 = min(cx + 50, frame.shape[1])
-            writer.write(frame[y1:y2, x1:x2])
 
-    cap.release()
-    for writer, _ in writers:
-        writer.release()
+def track_selected_beads(input, output, video_path, selections, num=None):
+    """
+    Track the selected beads straight from the full-field video, one decode
+    for all of them, into output/bead_i like export_selected_beads but with
+    tracks and plots instead of cropped videos.
+    """
+    if not os.path.exists(video_path):
+        raise FileNotFoundError(f"{video_path} does not exist.")
+    args = argparse.Namespace(
+        input=video_path,
+        output=output,
+        video=False,
+        threshold=175,
+        plot=True,
+        absolute=False,
+        text=True,
+    )
+    return track.process_beads(num, video_path, args, selections)
 
 
 class VideoFrameExplorer:
@@ -123,6 +293,9 @@ class VideoFrameExplorer:
         self.output = output
         self.current_index = 0
         self.detected_centers = []
+        self.video_info = VideoInfoCache()
+        # Cancel events of the exports/tracking runs started from here
+        self.runs = set()
 
         self.canvas = tk.Canvas(self.root, width=960, height=540)
         self.canvas.pack()
@@ -141,6 +314,26 @@ class VideoFrameExplorer:
             command=self.export_one,
         )
         self.export_single_button.pack(side=tk.LEFT)
+        self.track_beads_button = ttk.Button(
+            self.export_button_frame,
+            text=f"Track Beads up to Video {self.current_index+1}",
+            command=self.track_beads,
+        )
+        self.track_beads_button.pack(side=tk.LEFT)
+        self.lossless_var = tk.BooleanVar(value=False)
+        self.lossless_check = ttk.Checkbutton(
+            self.export_button_frame,
+            text="Lossless (.npy)",
+            variable=self.lossless_var,
+        )
+        self.lossless_check.pack(side=tk.LEFT, padx=(10, 0))
+        self.cancel_button = ttk.Button(
+            self.export_button_frame,
+            text="Cancel",
+            command=self.cancel_runs,
+            state="disabled",
+        )
+        self.cancel_button.pack(side=tk.LEFT, padx=(10, 0))
 
         self.edit2_button_frame = ttk.Frame(self.root)
         self.edit2_button_frame.pack(side=tk.BOTTOM, pady=(5, 0))
@@ -204,7 +397,7 @@ class VideoFrameExplorer:
         )
         self.last_button.pack(side=tk.LEFT)
 
-        frame = get_first_frame(self.video_paths[self.current_index])
+        frame = self.video_info.first_frame(self.video_paths[self.current_index])
         self.detect_and_draw_centers(frame)
         self.show_frame(self.current_index)
         self.update_button_states()
@@ -261,13 +454,13 @@ class VideoFrameExplorer:
 
     def remove_all_rectangles(self):
         self.detected_centers.clear()
-        frame = get_first_frame(self.video_paths[self.current_index])
+        frame = self.video_info.first_frame(self.video_paths[self.current_index])
         if frame is not None:
             self.update_canvas(frame)
         self.redraw_rectangles()
 
     def recreate_rectangles(self):
-        frame = get_first_frame(self.video_paths[self.current_index])
+        frame = self.video_info.first_frame(self.video_paths[self.current_index])
         if frame is not None:
             self.detect_and_draw_centers(frame)
             # self.update_canvas(frame)
@@ -291,7 +484,7 @@ class VideoFrameExplorer:
         )
 
     def get_scale(self):
-        orig_width, orig_height = get_frame_size(self.video_paths[self.current_index])
+        orig_width, orig_height = self.video_info.frame_size(self.video_paths[self.current_index])
         disp_width, disp_height = 960, 540
 
         # Calculate scaling factors for width and height
@@ -301,7 +494,7 @@ class VideoFrameExplorer:
 
     def on_canvas_click(self, event):
         x, y = event.x, event.y
-        orig_width, orig_height = get_frame_size(self.video_paths[self.current_index])
+        orig_width, orig_height = self.video_info.frame_size(self.video_paths[self.current_index])
         disp_width = 960
         scale = disp_width / orig_width if orig_width else 1
         half_side_length_scaled = scale * 50
@@ -322,7 +515,7 @@ class VideoFrameExplorer:
 
     def on_canvas_right_click(self, event):
         x, y = event.x, event.y
-        orig_width, orig_height = get_frame_size(self.video_paths[self.current_index])
+        orig_width, orig_height = self.video_info.frame_size(self.video_paths[self.current_index])
         disp_width = 960
         scale = disp_width / orig_width if orig_width else 1
         half_side_length_scaled = scale * 50
@@ -344,7 +537,7 @@ class VideoFrameExplorer:
 
     def show_frame(self, index):
         self.current_index = index
-        frame = get_first_frame(self.video_paths[index])
+        frame = self.video_info.first_frame(self.video_paths[index])
         if frame is not None:
             self.update_canvas(frame)
             self.export_single_button.config(
@@ -353,11 +546,40 @@ class VideoFrameExplorer:
             self.export_all_button.config(
                 text=f"Export up to Video {self.current_index+1}"
             )
+            self.track_beads_button.config(
+                text=f"Track Beads up to Video {self.current_index+1}"
+            )
             self.redraw_rectangles()
         self.update_button_states()
+        # Have the neighbours ready before the user moves to them
+        self.video_info.prefetch(
+            self.video_paths[i]
+            for i in (index + 1, index - 1)
+            if 0 <= i < len(self.video_paths)
+        )
+
+    def run_in_background(self, work):
+        """Run work(progress, cancel) off the Tk thread; Cancel stops it."""
+
+        def done(future, cancelled):
+            self.runs.discard(cancel)
+            if not self.runs:
+                self.cancel_button["state"] = "disabled"
+            exc = future.exception()
+            if exc is not None and not isinstance(exc, track.Cancelled):
+                print(f"Export failed: {exc}")
+
+        cancel = background.start(self.root, work, self.progress, done)
+        self.runs.add(cancel)
+        self.cancel_button["state"] = "normal"
+
+    def cancel_runs(self):
+        for cancel in self.runs:
+            cancel.set()
+        self.cancel_button["state"] = "disabled"
 
     def export(self):
-        orig_width, orig_height = get_frame_size(self.video_paths[self.current_index])
+        orig_width, orig_height = self.video_info.frame_size(self.video_paths[self.current_index])
         disp_width = 960
         scale = disp_width / orig_width if orig_width else 1
         selected_centers = [
@@ -365,11 +587,17 @@ class VideoFrameExplorer:
             for center, clicked in self.detected_centers
             if clicked
         ]
-        self.progress.reset(total=self.current_index + 1)
+        if not selected_centers:
+            print("No centers selected for this video.")
+            return
 
-        if selected_centers:
+        video_files = self.video_paths[0 : self.current_index + 1]
+        lossless = self.lossless_var.get()
+
+        def work(progress, cancel):
+            progress.reset(total=len(video_files))
             try:
-                self.progress._tk_window.deiconify()
+                progress._tk_window.deiconify()
             except:
                 pass
             with ProcessPoolExecutor() as executor:
@@ -381,13 +609,14 @@ class VideoFrameExplorer:
                         self.output,
                         video_file,
                         selected_centers,
+                        lossless,
                     ): video_file
-                    for video_file in self.video_paths[0 : self.current_index + 1]
+                    for video_file in video_files
                 }
 
-                for future in as_completed(future_to_video):
+                for future in track.iter_completed(executor, future_to_video, cancel):
                     # Update the progress bar manually
-                    self.progress.update(1)
+                    progress.update(1)
 
                     try:
                         result = future.result()
@@ -396,17 +625,66 @@ class VideoFrameExplorer:
                         print(f"{video_name} generated an exception: {exc}")
 
                 # Finish the progress bar
-                self.progress.n = self.progress.total
-                self.progress.refresh()
+                progress.n = progress.total
+                progress.refresh()
                 try:
-                    self.progress._tk_window.withdraw()
+                    progress._tk_window.withdraw()
                 except:
                     pass
-        else:
+
+        self.run_in_background(work)
+
+    def track_beads(self):
+        orig_width, orig_height = self.video_info.frame_size(self.video_paths[self.current_index])
+        disp_width = 960
+        scale = disp_width / orig_width if orig_width else 1
+        selected_centers = [
+            (int(center[0] / scale), int(center[1] / scale))
+            for center, clicked in self.detected_centers
+            if clicked
+        ]
+        if not selected_centers:
             print("No centers selected for this video.")
+            return
+
+        video_files = self.video_paths[0 : self.current_index + 1]
+
+        def work(progress, cancel):
+            progress.reset(total=len(video_files))
+            try:
+                progress._tk_window.deiconify()
+            except:
+                pass
+            with ProcessPoolExecutor() as executor:
+                future_to_video = {
+                    executor.submit(
+                        track_selected_beads,
+                        self.input,
+                        self.output,
+                        video_file,
+                        selected_centers,
+                        num,
+                    ): video_file
+                    for num, video_file in enumerate(video_files)
+                }
+                for future in track.iter_completed(executor, future_to_video, cancel):
+                    progress.update(1)
+                    try:
+                        future.result()
+                    except Exception as exc:
+                        print(f"{future_to_video[future]} generated an exception: {exc}")
+
+            progress.n = progress.total
+            progress.refresh()
+            try:
+                progress._tk_window.withdraw()
+            except:
+                pass
+
+        self.run_in_background(work)
 
     def export_one(self):
-        orig_width, orig_height = get_frame_size(self.video_paths[self.current_index])
+        orig_width, orig_height = self.video_info.frame_size(self.video_paths[self.current_index])
         disp_width = 960
         scale = disp_width / orig_width if orig_width else 1
         selected_centers = [
@@ -416,10 +694,16 @@ class VideoFrameExplorer:
         ]
 
         if selected_centers:
-            export_selected_beads(self.input,
-            self.output,
-            self.video_paths[self.current_index],
-            selected_centers)
+            video_file = self.video_paths[self.current_index]
+            lossless = self.lossless_var.get()
+
+            def work(progress, cancel):
+                if not cancel.is_set():
+                    export_selected_beads(
+                        self.input, self.output, video_file, selected_centers, lossless
+                    )
+
+            self.run_in_background(work)
         else:
             print("No centers selected for this video.")
 
@@ -0,0 +1,276 @@
+import os
+import cv2
+import json
+import hashlib
+import numpy as np
+
+
+# Opt-in cache of decoded grayscale frames, one memory-mapped .npy per
+# video, so re-running tracking doesn't decode the video again.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".dynabeads", "frames")
+DEFAULT_CACHE_SIZE_GB = 20
+
+
+def is_frame_stack(path):
+    """
+    Lossless frame stacks (crop.export_selected_beads(lossless=True)) are a
+    (frames, height, width) uint8 .npy with a .json sidecar next to it.
+    """
+    return path.endswith(".npy") and os.path.exists(frame_stack_metadata_path(path))
+
+
+def frame_stack_metadata_path(path):
+    return os.path.splitext(path)[0] + ".json"
+
+
+def load_frame_stack(path):
+    """(frames, metadata) of a frame stack, frames memory-mapped."""
+    with open(frame_stack_metadata_path(path)) as f:
+        metadata = json.load(f)
+    frames = np.load(path, mmap_mode="r")
+    metadata["height"], metadata["width"] = frames.shape[1:3]
+    return frames, metadata
+
+
+class FrameStackWriter:
+    """
+    cv2.VideoWriter stand-in that stores grayscale frames losslessly as a
+    frame stack. frame_count is an upper bound; unused frames are dropped.
+    """
+
+    def __init__(self, path, frame_count, size, metadata):
+        self.path = path
+        self.metadata = dict(metadata)
+        self.partial_path = f"{path}.{os.getpid()}.partial"
+        width, height = size
+        self.frames = np.lib.format.open_memmap(
+            self.partial_path, mode="w+", dtype=np.uint8, shape=(frame_count, height, width)
+        )
+        self.written = 0
+
+    def write(self, frame):
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.frames[self.written] = frame
+        self.written += 1
+
+    def release(self):
+        frame_count = len(self.frames)
+        self.frames.flush()
+        del self.frames
+        if self.written < frame_count:
+            truncated = np.load(self.partial_path, mmap_mode="r")[: self.written]
+            np.save(self.path + ".tmp.npy", truncated)
+            del truncated
+            os.replace(self.path + ".tmp.npy", self.partial_path)
+        self.metadata["frame_count"] = self.written
+        with open(frame_stack_metadata_path(self.path), "w") as f:
+            json.dump(self.metadata, f)
+        os.replace(self.partial_path, self.path)
+
+
+def cache_key(video_path):
+    """Key on everything that changes the decoded frames."""
+    stat = os.stat(video_path)
+    key = {
+        "source": os.path.abspath(video_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def cache_paths(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}.npy"), os.path.join(cache_dir, f"{key}.json")
+
+
+def load_frames(video_path, cache_dir=DEFAULT_CACHE_DIR):
+    """Return (frames, metadata) from the cache, or None if it isn't cached."""
+    frames_path, meta_path = cache_paths(cache_dir, cache_key(video_path))
+    if not (os.path.exists(frames_path) and os.path.exists(meta_path)):
+        return None
+    try:
+        with open(meta_path) as f:
+            metadata = json.load(f)
+        frames = np.load(frames_path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    # Touch the entry so eviction is least-recently-used
+    os.utime(frames_path)
+    return frames, metadata
+
+
+def build_frames(video_path, cache_dir=DEFAULT_CACHE_DIR, max_bytes=None):
+    """Decode a video to grayscale into the cache."""
+    os.makedirs(cache_dir, exist_ok=True)
+    frames_path, meta_path = cache_paths(cache_dir, cache_key(video_path))
+
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    metadata = {
+        "source": os.path.abspath(video_path),
+        "fps": video.get(cv2.CAP_PROP_FPS),
+        "width": width,
+        "height": height,
+    }
+
+    # Write under a temporary name so readers never see a partial cache
+    partial_path = f"{frames_path}.{os.getpid()}.partial"
+    frames = np.lib.format.open_memmap(
+        partial_path, mode="w+", dtype=np.uint8, shape=(frame_count, height, width)
+    )
+    decoded = 0
+    try:
+        while decoded < frame_count:
+            read, frame = video.read()
+            if not read:
+                break
+            frames[decoded] = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            decoded += 1
+        frames.flush()
+    finally:
+        video.release()
+        del frames
+
+    if decoded < frame_count:
+        # The container over-reported its length; keep only what decoded
+        truncated = np.load(partial_path, mmap_mode="r")[:decoded]
+        np.save(frames_path + ".tmp.npy", truncated)
+        del truncated
+        os.replace(frames_path + ".tmp.npy", partial_path)
+    metadata["frame_count"] = decoded
+    with open(meta_path, "w") as f:
+        json.dump(metadata, f)
+    os.replace(partial_path, frames_path)
+
+    if max_bytes is not None:
+        evict(cache_dir, max_bytes, keep=frames_path)
+    return load_frames(video_path, cache_dir)
+
+
+def evict(cache_dir, max_bytes, keep=None):
+    """Delete least-recently-used entries until the cache fits in max_bytes."""
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".npy") and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            # Still memory-mapped by another worker (Windows won't delete
+            # open files); leave it for a later eviction
+            continue
+        try:
+            os.remove(path[: -len(".npy")] + ".json")
+        except OSError:
+            pass
+        total -= size
+
+
+class CachedCapture:
+    """
+    Read-only stand-in for cv2.VideoCapture over cached grayscale frames.
+    read() returns 2-D uint8 frames.
+    """
+
+    def __init__(self, frames, metadata):
+        self.frames = frames
+        self.metadata = metadata
+        self.position = 0
+
+    def isOpened(self):
+        return self.frames is not None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return float(len(self.frames))
+        if prop == cv2.CAP_PROP_FPS:
+            return float(self.metadata["fps"])
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.metadata["width"])
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.metadata["height"])
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        return 0.0
+
+    def set(self, prop, value):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            self.position = int(value)
+            return True
+        return False
+
+    def grab(self):
+        if self.position >= len(self.frames):
+            return False
+        self.position += 1
+        return True
+
+    def read(self):
+        if self.position >= len(self.frames):
+            return False, None
+        frame = np.asarray(self.frames[self.position])
+        self.position += 1
+        return True, frame
+
+    def release(self):
+        self.frames = None
+
+
+def cache_settings(args):
+    """(cache_dir, max_bytes) from args, or None when the cache is off."""
+    cache_dir = getattr(args, "frame_cache", None)
+    if not cache_dir:
+        return None
+    size_gb = getattr(args, "frame_cache_size", None) or DEFAULT_CACHE_SIZE_GB
+    return cache_dir, int(size_gb * 1024**3)
+
+
+def ensure_cached(video_path, args):
+    """Build the cache entry for a video if the cache is on and it's missing."""
+    if is_frame_stack(video_path):
+        # Already decoded
+        return load_frame_stack(video_path)
+    settings = cache_settings(args)
+    if settings is None:
+        return None
+    cache_dir, max_bytes = settings
+    cached = load_frames(video_path, cache_dir)
+    if cached is None:
+        cached = build_frames(video_path, cache_dir, max_bytes=max_bytes)
+    return cached
+
+
+def open_video(video_path, args):
+    """
+    cv2.VideoCapture, or a CachedCapture for a frame stack or when
+    args.frame_cache is set.
+    """
+    cached = ensure_cached(video_path, args)
+    if cached is None:
+        return cv2.VideoCapture(video_path)
+    return CachedCapture(*cached)
+
+
+def first_frame(video_path, cache_dir=DEFAULT_CACHE_DIR):
+    """First cached grayscale frame, or None if the video isn't cached."""
+    if is_frame_stack(video_path):
+        cached = load_frame_stack(video_path)
+    else:
+        cached = load_frames(video_path, cache_dir)
+    if cached is None or len(cached[0]) == 0:
+        return None
+    return np.asarray(cached[0][0])
@@ -1,30 +1,69 @@
+import time
+
+STARTED = time.perf_counter()
+
 import os
 import sys
-import cv2
-import crop
-import track
 import warnings
-import requests
 import argparse
 import json
-import webbrowser
+import importlib
+import threading
+import background
 import tkinter as tk
 import multiprocessing
-from tqdm.tk import tqdm
 from tkinter import filedialog, messagebox, ttk
-from matplotlib import pyplot as plt
-from tqdm import TqdmExperimentalWarning
-from matplotlib.widgets import Slider, Button
 
 
 # Define the version
 __version__ = "3.1.0"
 
+# Heavy modules the GUI imports on first use rather than before its window is
+# up, in the order --startup-report times them
+DEFERRED_IMPORTS = [
+    "tqdm.tk",
+    "requests",
+    "numpy",
+    "cv2",
+    "matplotlib.pyplot",
+    "framecache",
+    "track",
+    "crop",
+]
+
 
 if getattr(sys, "frozen", False):
     import pyi_splash
 
 
+def framecache_dir():
+    import framecache
+
+    return framecache.DEFAULT_CACHE_DIR
+
+
+class ProgressBar:
+    """The shared tqdm.tk progress window, created on first use."""
+
+    def __init__(self, root):
+        self.root = root
+        self.bar = None
+
+    def get(self):
+        if self.bar is None:
+            from tqdm import TqdmExperimentalWarning
+            from tqdm.tk import tqdm
+
+            warnings.filterwarnings("ignore", category=TqdmExperimentalWarning)
+            self.bar = tqdm(
+                tk_parent=self.root,
+                desc="Overall Progress",
+                unit="video",
+            )
+            self.bar._tk_window.withdraw()
+        return self.bar
+
+
 def select_folder(folder_path_var):
     folder_selected = filedialog.askdirectory(
         initialdir=folder_path_var.get(), title="Select Folder"
@@ -36,6 +75,8 @@ def select_folder(folder_path_var):
 def open_crop_tool(root, input_path_var, output_path_var, progress):
     # Placeholder for the crop tool functionality
     # This function needs to be implemented or linked to the actual cropping tool you intend to use.
+    import crop
+
     video_files = crop.get_sorted_video_files(input_path_var.get())
     if video_files:
         child = tk.Toplevel(root)
@@ -44,7 +85,7 @@ def open_crop_tool(root, input_path_var, output_path_var, progress):
 
         child.title("Crop Tool")
         crop.VideoFrameExplorer(
-            child, input_path_var.get(), output_path_var.get(), progress
+            child, input_path_var.get(), output_path_var.get(), progress.get()
         )
         root.eval(f"tk::PlaceWindow {str(child)} center")
     else:
@@ -52,16 +93,20 @@ def open_crop_tool(root, input_path_var, output_path_var, progress):
 
 
 def run(
+    root,
     input,
     output,
     absolute,
     plot,
     text,
+    npz,
     video,
+    frame_cache,
     threshold,
     long_video,
     long_video_protocol,
     button,
+    cancel_button,
     progress,
 ):
     args = dict(
@@ -72,22 +117,49 @@ def run(
         plot=plot.get(),
         absolute=absolute.get(),
         text=text.get(),
+        npz=npz.get(),
+        # Shared with the CLI's --frame-cache default and the threshold preview
+        frame_cache=framecache_dir() if frame_cache.get() else None,
         long_video=long_video.get(),
-        long_video_protocol=long_video_protocol,
+        # Empty until the segment editor first opens; track falls back to the default
+        long_video_protocol=long_video_protocol or None,
     )
     args = argparse.Namespace(**args)
     button["state"] = "disabled"
-    track.process_folder(args, progress)
-    button["state"] = "normal"
+    cancel_button["state"] = "normal"
+
+    def done(future, cancelled):
+        button["state"] = "normal"
+        cancel_button["state"] = "disabled"
+        if future.exception() is not None:
+            messagebox.showerror("Error", f"Processing failed:\n{future.exception()}")
+        elif not future.result():
+            # Only when it actually stopped; a cancel after the last job is moot
+            messagebox.showinfo("Cancelled", "Processing was cancelled.")
+
+    def work(progress, cancel):
+        import track
+
+        return track.process_folder(args, progress, cancel)
+
+    cancel = background.start(root, work, progress.get(), done)
+
+    def request_cancel():
+        cancel.set()
+        cancel_button["state"] = "disabled"
+
+    cancel_button.configure(command=request_cancel)
 
 
 def track_settings(
     root,
     parent,
     text_var,
+    npz_var,
     plot_var,
     absolute_var,
     video_var,
+    frame_cache_var,
     threshold_var,
     input_folder_var,
 ):
@@ -104,20 +176,26 @@ def track_settings(
     ttk.Checkbutton(frame, text="Export text", variable=text_var).grid(
         row=0, column=0, sticky=tk.W
     )
-    ttk.Checkbutton(frame, text="Export plot", variable=plot_var).grid(
+    ttk.Checkbutton(frame, text="Export binary (.npz)", variable=npz_var).grid(
         row=1, column=0, sticky=tk.W
     )
-    ttk.Checkbutton(frame, text="Match video dimensions", variable=absolute_var).grid(
+    ttk.Checkbutton(frame, text="Export plot", variable=plot_var).grid(
         row=2, column=0, sticky=tk.W
     )
-    ttk.Checkbutton(frame, text="Export annotated video", variable=video_var).grid(
+    ttk.Checkbutton(frame, text="Match video dimensions", variable=absolute_var).grid(
         row=3, column=0, sticky=tk.W
     )
+    ttk.Checkbutton(frame, text="Export annotated video", variable=video_var).grid(
+        row=4, column=0, sticky=tk.W
+    )
+    ttk.Checkbutton(frame, text="Cache decoded frames", variable=frame_cache_var).grid(
+        row=5, column=0, sticky=tk.W
+    )
 
     threshold_text_var = tk.StringVar()
     threshold_text_var.set(f"Threshold: {threshold_var.get()}")
     ttk.Label(frame, textvariable=threshold_text_var).grid(
-        row=4, column=0, pady=(20, 0)
+        row=6, column=0, pady=(20, 0)
     )
     ttk.Button(
         frame,
@@ -125,11 +203,11 @@ def track_settings(
         command=lambda: threshold_settings(
             root, threshold_var, threshold_text_var, input_folder_var
         ),
-    ).grid(row=5, column=0)
+    ).grid(row=7, column=0)
 
     # Ok button to close the dialog
     ttk.Button(frame, text="Ok", command=top.destroy).grid(
-        row=6, column=0, pady=(20, 0)
+        row=8, column=0, pady=(20, 0)
     )
 
     # Make the dialog modal
@@ -140,12 +218,22 @@ def track_settings(
 
 
 def threshold_settings(root, threshold_var, threshold_text_var, input_folder_var):
+    import cv2
+    import crop
+    import framecache
+    from matplotlib import pyplot as plt
+    from matplotlib.widgets import Slider, Button
+
     # Load the image
     video_files = crop.get_sorted_video_files(input_folder_var.get())
     video_path = os.path.join(input_folder_var.get(), video_files[0])
-    cap = cv2.VideoCapture(video_path)
-
-    success, img = cap.read()
+    cached = framecache.first_frame(video_path)
+    if cached is not None:
+        success, img = True, cv2.cvtColor(cached, cv2.COLOR_GRAY2BGR)
+    else:
+        cap = cv2.VideoCapture(video_path)
+        success, img = cap.read()
+        cap.release()
     # img = cv2.imread(input)
     if not success:
         root.messagebox.showerror("Error", "Could not load image.")
@@ -228,6 +316,10 @@ def _format_protocol_summary(protocol):
 
 
 def segment_settings(root, parent, long_video_var, protocol_steps):
+    import track
+
+    if not protocol_steps:
+        protocol_steps.extend(track.default_long_video_protocol())
     top = tk.Toplevel(parent)
     top.title("Long Video Segments")
     icon = tk.PhotoImage(file="icon.png")
@@ -534,6 +626,8 @@ def show_help(type):
 
 def new_version_check():
     try:
+        import requests
+
         response = requests.get("https://api.github.com/repos/benonymity/Dynabeads/releases/latest")
         latest_version = response.json()["tag_name"].replace("v", "")
     except:
@@ -544,15 +638,59 @@ def new_version_check():
     else:
         return False
 
+
+def check_for_updates(root, update_buttons):
+    """
+    Check for a new release off the Tk thread, so a slow network doesn't hold
+    up startup, then show the (grid_remove'd) update buttons if there is one.
+    """
+    result = []
+    thread = threading.Thread(
+        target=lambda: result.append(new_version_check()), daemon=True
+    )
+    thread.start()
+
+    def poll():
+        if thread.is_alive():
+            root.after(200, poll)
+            return
+        if result and result[0]:
+            for button in update_buttons:
+                button.grid()
+            tk.messagebox.showinfo("Update Available", "A new version is available!")
+
+    root.after(200, poll)
+
+
+def open_latest_release():
+    import webbrowser
+
+    webbrowser.open("https://github.com/benonymity/Dynabeads/releases/latest")
+
+
+def startup_report():
+    """Print time to the main window and the import cost of each deferred module."""
+    print(f"Main window shown {(time.perf_counter() - STARTED) * 1000:.0f} ms after gui.py started")
+    early = [name for name in DEFERRED_IMPORTS if name in sys.modules]
+    if early:
+        print(f"Imported before the window was shown: {', '.join(early)}")
+    for name in DEFERRED_IMPORTS:
+        start = time.perf_counter()
+        importlib.import_module(name)
+        print(f"  {name:<20} {(time.perf_counter() - start) * 1000:8.0f} ms")
+
+
 def setup_track_tab(
     root,
     tab,
     track_input_path_var,
     track_output_path_var,
     text_var,
+    npz_var,
     plot_var,
     absolute_var,
     video_var,
+    frame_cache_var,
     threshold_var,
     long_video_var,
     long_video_protocol,
@@ -589,9 +727,11 @@ def setup_track_tab(
             root,
             frame,
             text_var,
+            npz_var,
             plot_var,
             absolute_var,
             video_var,
+            frame_cache_var,
             threshold_var,
             track_input_path_var,
         ),
@@ -608,29 +748,35 @@ def setup_track_tab(
         actions,
         text="Start Processing",
         command=lambda: run(
+            root,
             track_input_path_var,
             track_output_path_var,
             absolute_var,
             plot_var,
             text_var,
+            npz_var,
             video_var,
+            frame_cache_var,
             threshold_var,
             long_video_var,
             long_video_protocol,
             processing_button,
+            cancel_button,
             progress,
         ),
     )
     processing_button.pack(side=tk.LEFT)
 
+    cancel_button = ttk.Button(actions, text="Cancel", state="disabled")
+    cancel_button.pack(side=tk.LEFT, padx=(8, 0))
+
     help_button = ttk.Button(frame, text="Help", command=lambda: show_help("Track"))
     help_button.grid(row=3, column=2, sticky=tk.E, pady=(10, 0))
 
-    if new_version_check():
-        update_button = ttk.Button(
-            frame, text="Update Available", command=lambda: webbrowser.open("https://github.com/benonymity/Dynabeads/releases/latest")
-        )
-        update_button.grid(row=3, column=0, sticky=tk.W, pady=(10, 0))
+    update_button = ttk.Button(frame, text="Update Available", command=open_latest_release)
+    update_button.grid(row=3, column=0, sticky=tk.W, pady=(10, 0))
+    update_button.grid_remove()
+    return update_button
 
 
 def setup_crop_tab(root, tab, input_path_var, output_path_var, progress):
@@ -661,14 +807,13 @@ def setup_crop_tab(root, tab, input_path_var, output_path_var, progress):
     help_button = ttk.Button(frame, text="Help", command=lambda: show_help("Track"))
     help_button.grid(row=3, column=2, sticky=tk.E)
 
-    if new_version_check():
-        update_button = ttk.Button(
-            frame, text="Update Available", command=lambda: webbrowser.open("https://github.com/benonymity/Dynabeads/releases/latest")
-        )
-        update_button.grid(row=3, column=0, sticky=tk.W)
+    update_button = ttk.Button(frame, text="Update Available", command=open_latest_release)
+    update_button.grid(row=3, column=0, sticky=tk.W)
+    update_button.grid_remove()
+    return update_button
 
 
-def create_gui():
+def create_gui(report_startup=False):
     root = tk.Tk()
     root.title("Dynabead Tools")
     icon = tk.PhotoImage(file="icon.png")
@@ -683,21 +828,18 @@ def create_gui():
     )
 
     text_var = tk.BooleanVar(value=True)
+    npz_var = tk.BooleanVar()
     plot_var = tk.BooleanVar()
     absolute_var = tk.BooleanVar()
     video_var = tk.BooleanVar()
+    frame_cache_var = tk.BooleanVar()
 
     threshold_var = tk.IntVar(value=175)
     long_video_var = tk.BooleanVar(value=False)
-    long_video_protocol = track.default_long_video_protocol()
+    # Filled with the default protocol when the segment editor first opens
+    long_video_protocol = []
 
-    warnings.filterwarnings("ignore", category=TqdmExperimentalWarning)
-    progress = tqdm(
-        tk_parent=root,
-        desc="Overall Progress",
-        unit="video",
-    )
-    progress._tk_window.withdraw()
+    progress = ProgressBar(root)
 
     tab_control = ttk.Notebook(root)
 
@@ -708,15 +850,17 @@ def create_gui():
     tab_control.add(crop_tab, text="Crop")
 
     # Existing setup now under 'Track' tab
-    setup_track_tab(
+    track_update_button = setup_track_tab(
         root,
         track_tab,
         track_input_path_var,
         track_output_path_var,
         text_var,
+        npz_var,
         plot_var,
         absolute_var,
         video_var,
+        frame_cache_var,
         threshold_var,
         long_video_var,
         long_video_protocol,
@@ -724,7 +868,9 @@ def create_gui():
     )
 
     # New 'Crop' tab setup
-    setup_crop_tab(root, crop_tab, crop_input_path_var, crop_output_path_var, progress)
+    crop_update_button = setup_crop_tab(
+        root, crop_tab, crop_input_path_var, crop_output_path_var, progress
+    )
 
     tab_control.pack(expand=1, fill="both")
 
@@ -736,12 +882,21 @@ def create_gui():
     if getattr(sys, "frozen", False):
         pyi_splash.close()
 
-    if new_version_check():
-        tk.messagebox.showinfo("Update Available", "A new version is available!")
+    check_for_updates(root, [track_update_button, crop_update_button])
+
+    if report_startup:
+        root.update()
+        startup_report()
 
     root.mainloop()
 
 
 if __name__ == "__main__":
     multiprocessing.freeze_support()
-    create_gui()
+    parser = argparse.ArgumentParser(description="Dynabead Tools GUI.")
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="Print how long the main window took to show and what each deferred import costs",
+    )
+    create_gui(parser.parse_args().startup_report)
@@ -3,14 +3,17 @@ import sys
 import cv2
 import math
 import json
+import queue
 import argparse
+import threading
+import time
 import numpy as np
 import pandas as pd
-import tkinter as tk
+import framecache
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 from scipy.stats import linregress
-from scipy.optimize import minimize
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
 
 
 # Long-video protocol: alternating precess / hold blocks.
@@ -19,6 +22,8 @@ LONG_VIDEO_PRECESS_FREQS = [
 ]
 DEFAULT_PRECESS_DURATION_SEC = 30
 DEFAULT_HOLD_DURATION_SEC = 10
+# How often pool loops check whether a run has been cancelled
+CANCEL_POLL_SEC = 0.2
 
 
 def default_long_video_protocol(
@@ -105,49 +110,253 @@ def segment_title_prefix(kind, freq_hz):
     return "Hold field (+x), "
 
 
+DEFAULT_THRESHOLD = 175
+# Pixels of context kept around a search window so the 9x9 blur inside the
+# window matches the full-frame blur exactly
+BLUR_MARGIN = 4
+
+
+def find_bead_contour(blur, threshold, max_area):
+    """Return the largest bead-sized contour in a blurred grayscale image."""
+    _, thresh = cv2.threshold(blur, threshold, 255, cv2.THRESH_BINARY)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    min_area = 20
+    valid = [
+        c
+        for c in contours
+        if min_area < cv2.contourArea(c) < max_area
+    ]
+    if not valid:
+        return None
+    return max(valid, key=cv2.contourArea)
+
+
+def to_gray(frame):
+    """Frames from the frame cache are already grayscale."""
+    if frame.ndim == 2:
+        return frame
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
 # Function to the detect the center of the dot
 def detect_center(frame, args):
-    if not args.threshold:
-        threshold = 175
-    else:
-        threshold = args.threshold
-    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    threshold = args.threshold or DEFAULT_THRESHOLD
+    gray = to_gray(frame)
     blur = cv2.GaussianBlur(gray, (9, 9), 2, 2)
-    _, thresh = cv2.threshold(blur, threshold, 255, cv2.THRESH_BINARY)
-    contours, _ = cv2.findContours(thresh, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    return center_from_blur(blur, threshold)
+
+
+def center_from_blur(blur, threshold):
+    """Bead center in a blurred full frame, measured from the bottom left."""
+    frame_area = blur.shape[0] * blur.shape[1]
+    largest_contour = find_bead_contour(blur, threshold, frame_area * 0.1)
     center = None
-    if contours:
-        frame_area = frame.shape[0] * frame.shape[1]
-        min_area = 20
-        max_area = frame_area * 0.1
-        valid = [
-            c
-            for c in contours
-            if min_area < cv2.contourArea(c) < max_area
-        ]
-        if not valid:
-            return None
-        largest_contour = max(valid, key=cv2.contourArea)
+    if largest_contour is not None:
         M = cv2.moments(largest_contour)
         if M["m00"] != 0:
             # OpenCV uses the top left corner of the image as the origin,
             # so we need to invert the y coordinate to measure from the bottom left
-            center = (((M["m10"] / M["m00"])), (frame.shape[0] - (M["m01"] / M["m00"])))
+            center = (((M["m10"] / M["m00"])), (blur.shape[0] - (M["m01"] / M["m00"])))
     return center
 
 
+def detect_center_roi(frame, args, previous, roi_size):
+    """
+    Search only a roi_size square around the previous center.
+    Returns None if the bead isn't found or touches the window edge, in which
+    case the caller should fall back to a full-frame search.
+    """
+    threshold = args.threshold or DEFAULT_THRESHOLD
+    height, width = frame.shape[:2]
+    half = roi_size // 2
+    px, py = int(round(previous[0])), int(round(height - previous[1]))
+    x1, x2 = max(0, px - half), min(width, px + half)
+    y1, y2 = max(0, py - half), min(height, py + half)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+
+    # Blur a slightly larger patch, then keep only the window itself
+    bx1, bx2 = max(0, x1 - BLUR_MARGIN), min(width, x2 + BLUR_MARGIN)
+    by1, by2 = max(0, y1 - BLUR_MARGIN), min(height, y2 + BLUR_MARGIN)
+    gray = to_gray(frame[by1:by2, bx1:bx2])
+    blur = cv2.GaussianBlur(gray, (9, 9), 2, 2)
+    blur = blur[y1 - by1 : y2 - by1, x1 - bx1 : x2 - bx1]
+
+    contour = find_bead_contour(blur, threshold, width * height * 0.1)
+    if contour is None:
+        return None
+    cx, cy, cw, ch = cv2.boundingRect(contour)
+    # A blob cut off by the window (but not by the frame) may be clipped
+    if (cx == 0 and x1 > 0) or (cy == 0 and y1 > 0):
+        return None
+    if (cx + cw == x2 - x1 and x2 < width) or (cy + ch == y2 - y1 and y2 < height):
+        return None
+    M = cv2.moments(contour)
+    if M["m00"] == 0:
+        return None
+    return (x1 + M["m10"] / M["m00"], height - (y1 + M["m01"] / M["m00"]))
+
+
+def follow_center(frame, args, previous, stats):
+    """
+    Track from the previous center with a small search window when
+    args.roi_size is set, falling back to a full-frame search when the bead
+    is lost. Lost and reacquired events are counted in stats.
+    """
+    roi_size = getattr(args, "roi_size", None)
+    if not roi_size:
+        return detect_center(frame, args)
+    if previous is not None:
+        center = detect_center_roi(frame, args, previous, roi_size)
+        if center is not None:
+            return center
+        stats["lost"] += 1
+    center = detect_center(frame, args)
+    if center is not None and stats["lost"] > stats["reacquired"]:
+        stats["reacquired"] += 1
+    return center
+
+
+def new_tracking_stats():
+    return {"lost": 0, "reacquired": 0}
+
+
+def format_tracking_stats(stats):
+    return f"roi_lost={stats['lost']} roi_reacquired={stats['reacquired']}"
+
+
+class FrameReader:
+    """
+    Decode frames on a background thread into a bounded queue so decoding
+    overlaps with detection (OpenCV releases the GIL while it works).
+    Drop-in for the read()/release() part of cv2.VideoCapture.
+    """
+
+    def __init__(self, video, max_frames, depth=8):
+        self.video = video
+        self.frames = queue.Queue(maxsize=depth)
+        self.depth = depth
+        self.stopped = threading.Event()
+        # Time the reader spent blocked on a full queue means detection is
+        # the bottleneck; time the consumer spent on an empty queue means decoding is
+        self.decode_sec = 0.0
+        self.reader_wait_sec = 0.0
+        self.consumer_wait_sec = 0.0
+        self.depth_total = 0
+        self.reads = 0
+        self.thread = threading.Thread(
+            target=self._decode, args=(max_frames,), daemon=True
+        )
+        self.thread.start()
+
+    def _decode(self, max_frames):
+        try:
+            for _ in range(max_frames):
+                if self.stopped.is_set():
+                    return
+                started = time.perf_counter()
+                read, frame = self.video.read()
+                self.decode_sec += time.perf_counter() - started
+                if not read:
+                    break
+                started = time.perf_counter()
+                self._put((True, frame))
+                self.reader_wait_sec += time.perf_counter() - started
+        finally:
+            # After release() nobody reads the marker, and a blocking put
+            # could refill the queue release() just drained and hang join()
+            self._put((False, None))
+
+    def _put(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.frames.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def read(self):
+        self.depth_total += self.frames.qsize()
+        self.reads += 1
+        started = time.perf_counter()
+        read, frame = self.frames.get()
+        self.consumer_wait_sec += time.perf_counter() - started
+        if not read:
+            # Leave the end marker for any further read() calls
+            self.frames.put((False, None))
+        return read, frame
+
+    def release(self):
+        self.stopped.set()
+        # Unblock a reader waiting on a full queue
+        while True:
+            try:
+                self.frames.get_nowait()
+            except queue.Empty:
+                break
+        self.thread.join()
+        self.video.release()
+
+    def report(self):
+        mean_depth = self.depth_total / self.reads if self.reads else 0.0
+        bound = "detect" if self.reader_wait_sec > self.consumer_wait_sec else "decode"
+        return (
+            f"prefetch depth={mean_depth:.1f}/{self.depth} "
+            f"decode={self.decode_sec:.2f}s "
+            f"decode_wait={self.reader_wait_sec:.2f}s "
+            f"detect_wait={self.consumer_wait_sec:.2f}s ({bound}-bound)"
+        )
+
+
+def open_frame_reader(video, args, max_frames):
+    """Wrap an opened capture in a FrameReader when args.prefetch is set."""
+    depth = getattr(args, "prefetch", None)
+    if not depth:
+        return video
+    return FrameReader(video, max_frames, depth)
+
+
+def report_frame_reader(reader, video_path):
+    if isinstance(reader, FrameReader):
+        print(f"{os.path.basename(video_path)}: {reader.report()}")
+
+
+def sample_centers(video, args, start_frame, step):
+    """
+    Yield (frame_index, center) for every step-th frame from start_frame.
+    Frames in between are only grabbed, never retrieved or color-converted.
+    """
+    video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    frame_index = start_frame
+    while True:
+        if (frame_index - start_frame) % step == 0:
+            read, frame = video.read()
+            if not read:
+                return
+            yield frame_index, detect_center(frame, args)
+        elif not video.grab():
+            return
+        frame_index += 1
+
+
 def detect_movement_start(
     video_path,
     args,
     sample_interval_sec=0.5,
     displacement_threshold_px=5,
     sustained_samples=3,
+    coarse_factor=None,
 ):
     """
     Find the frame index where bead motion begins by subsampling positions.
+    With coarse_factor (default args.onset_coarse) a sparse scan every
+    coarse_factor samples locates the onset first and only the stretch after
+    the last still coarse sample is scanned densely.
     Returns (start_frame, start_time_sec).
     """
-    video = cv2.VideoCapture(video_path)
+    video = framecache.open_video(video_path, args)
     if not video.isOpened():
         raise ValueError(f"Could not open video: {video_path}")
 
@@ -156,21 +365,98 @@ def detect_movement_start(
         fps = 25.0
     step = max(1, int(round(fps * sample_interval_sec)))
 
+    if coarse_factor is None:
+        coarse_factor = getattr(args, "onset_coarse", None)
+    if coarse_factor and coarse_factor > 1:
+        onset = coarse_movement_start(
+            video,
+            args,
+            fps,
+            step,
+            coarse_factor,
+            displacement_threshold_px,
+            sustained_samples,
+        )
+        if onset is not None:
+            video.release()
+            return onset
+
     positions = []
     frame_indices = []
-    frame_index = 0
-    while True:
-        read, frame = video.read()
-        if not read:
-            break
-        if frame_index % step == 0:
-            center = detect_center(frame, args)
-            if center is not None:
-                positions.append(center)
-                frame_indices.append(frame_index)
-        frame_index += 1
+    for frame_index, center in sample_centers(video, args, 0, step):
+        if center is not None:
+            positions.append(center)
+            frame_indices.append(frame_index)
     video.release()
 
+    return find_movement_start(
+        positions, frame_indices, fps, displacement_threshold_px, sustained_samples
+    )
+
+
+def coarse_movement_start(
+    video,
+    args,
+    fps,
+    step,
+    coarse_factor,
+    displacement_threshold_px,
+    sustained_samples,
+):
+    """
+    Coarse-to-fine onset search. Gives the same onset as the dense scan as
+    long as the bead doesn't make a sustained excursion and come back to rest
+    between two coarse samples. Returns None when the caller should fall
+    back to the dense scan (short or motionless videos).
+    """
+    # Baseline from the first 10 detected samples, exactly as the dense scan
+    baseline = []
+    for _, center in sample_centers(video, args, 0, step):
+        if center is not None:
+            baseline.append(center)
+            if len(baseline) == 10:
+                break
+    if len(baseline) < 10:
+        return None
+    baseline = np.median(np.array(baseline), axis=0)
+
+    def moved(center):
+        return np.linalg.norm(np.array(center) - baseline) > displacement_threshold_px
+
+    last_still = 0
+    for frame_index, center in sample_centers(video, args, 0, step * coarse_factor):
+        if center is None:
+            continue
+        if moved(center):
+            break
+        last_still = frame_index
+    else:
+        return None
+
+    run_start = None
+    run_length = 0
+    for frame_index, center in sample_centers(video, args, last_still, step):
+        if center is None:
+            continue
+        if moved(center):
+            if run_length == 0:
+                run_start = frame_index
+            run_length += 1
+            if run_length == sustained_samples:
+                return run_start, run_start / fps
+        else:
+            run_length = 0
+    return None
+
+
+def find_movement_start(
+    positions,
+    frame_indices,
+    fps,
+    displacement_threshold_px=5,
+    sustained_samples=3,
+):
+    """Onset search shared by the video scanner and the per-frame track."""
     if len(positions) < sustained_samples + 1:
         return 0, 0.0
 
@@ -186,6 +472,306 @@ def detect_movement_start(
     return frame_indices[0], 0.0
 
 
+def movement_start_from_track(
+    positions,
+    fps,
+    sample_interval_sec=0.5,
+    displacement_threshold_px=5,
+    sustained_samples=3,
+):
+    """
+    Same onset as detect_movement_start, but sampled from a per-frame track
+    (NaN rows where no bead was found) instead of decoding the video again.
+    """
+    step = max(1, int(round(fps * sample_interval_sec)))
+    frame_indices = np.arange(0, len(positions), step)
+    frame_indices = frame_indices[~np.isnan(positions[frame_indices, 0])]
+    return find_movement_start(
+        positions[frame_indices],
+        [int(i) for i in frame_indices],
+        fps,
+        displacement_threshold_px,
+        sustained_samples,
+    )
+
+
+def iter_tracked_frames(
+    video_path, args, start_frame=0, end_frame=None, previous=None, stats=None
+):
+    """
+    Yield (center, lost, reacquired) for every frame in [start_frame, end_frame).
+    previous and stats carry the ROI state in from an earlier frame range.
+    """
+    video = framecache.open_video(video_path, args)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    if end_frame is None:
+        end_frame = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    if start_frame > 0:
+        video.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    if stats is None:
+        stats = new_tracking_stats()
+    reader = open_frame_reader(video, args, max(0, end_frame - start_frame))
+
+    try:
+        for frame_index in range(start_frame, end_frame):
+            read, frame = reader.read()
+            if not read:
+                break
+            lost_before, reacquired_before = stats["lost"], stats["reacquired"]
+            center = follow_center(frame, args, previous, stats)
+            previous = center
+            yield (
+                center,
+                stats["lost"] - lost_before,
+                stats["reacquired"] - reacquired_before,
+            )
+        report_frame_reader(reader, video_path)
+    finally:
+        reader.release()
+
+
+def track_frames(video_path, args, start_frame=0, end_frame=None):
+    """
+    Track every frame in [start_frame, end_frame) without writing anything.
+    Returns (positions, lost, reacquired): positions is an (n, 2) array with
+    NaN rows where no bead was found, and lost/reacquired flag the frames
+    where the ROI search lost or reacquired the bead.
+    """
+    positions = []
+    lost = []
+    reacquired = []
+    for center, lost_event, reacquired_event in iter_tracked_frames(
+        video_path, args, start_frame, end_frame
+    ):
+        positions.append(center if center is not None else (np.nan, np.nan))
+        lost.append(lost_event)
+        reacquired.append(reacquired_event)
+
+    return (
+        np.array(positions, dtype=float).reshape(-1, 2),
+        np.array(lost, dtype=np.int8),
+        np.array(reacquired, dtype=np.int8),
+    )
+
+
+# Chunks shorter than this aren't worth a seek and a worker round trip
+MIN_CHUNK_FRAMES = 250
+# Side of the square window cut around each bead in multi-bead tracking,
+# the same window crop.export_selected_beads writes
+BEAD_WINDOW = 100
+
+
+def split_frame_range(start_frame, end_frame, chunks):
+    chunks = max(1, min(chunks, (end_frame - start_frame) // MIN_CHUNK_FRAMES))
+    bounds = np.linspace(start_frame, end_frame, chunks + 1).astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def submit_frame_chunks(executor, video_path, args, start_frame, end_frame, chunks):
+    """Queue track_frames for each contiguous chunk; returns [(bounds, future)]."""
+    return [
+        ((chunk_start, chunk_end), executor.submit(
+            track_frames, video_path, args, chunk_start, chunk_end
+        ))
+        for chunk_start, chunk_end in split_frame_range(start_frame, end_frame, chunks)
+    ]
+
+
+def stitch_frame_chunks(video_path, args, chunk_futures):
+    """
+    Concatenate chunk tracks in frame order. Without an ROI every frame is
+    tracked independently, so chunks join as-is. With an ROI each chunk
+    started with a full-frame search, so the frames after each boundary are
+    re-tracked from the previous chunk's last center until both agree on a
+    found bead; from there on the chunk is identical to a serial run.
+    """
+    positions = []
+    lost = []
+    reacquired = []
+    for (chunk_start, chunk_end), future in chunk_futures:
+        chunk_positions, chunk_lost, chunk_reacquired = future.result()
+        if positions and getattr(args, "roi_size", None):
+            chunk_positions = chunk_positions.copy()
+            chunk_lost = chunk_lost.copy()
+            chunk_reacquired = chunk_reacquired.copy()
+            resync_chunk(
+                video_path,
+                args,
+                chunk_start,
+                chunk_end,
+                np.concatenate(positions),
+                np.concatenate(lost),
+                np.concatenate(reacquired),
+                chunk_positions,
+                chunk_lost,
+                chunk_reacquired,
+            )
+        positions.append(chunk_positions)
+        lost.append(chunk_lost)
+        reacquired.append(chunk_reacquired)
+        if len(chunk_positions) < chunk_end - chunk_start:
+            # The video ended early; later chunks have nothing to add
+            break
+
+    if not positions:
+        return np.empty((0, 2)), np.empty(0, np.int8), np.empty(0, np.int8)
+    return np.concatenate(positions), np.concatenate(lost), np.concatenate(reacquired)
+
+
+def resync_chunk(
+    video_path,
+    args,
+    chunk_start,
+    chunk_end,
+    prior_positions,
+    prior_lost,
+    prior_reacquired,
+    chunk_positions,
+    chunk_lost,
+    chunk_reacquired,
+):
+    """Overwrite the start of a chunk with the serial result until they agree."""
+    last = prior_positions[-1]
+    previous = None if np.isnan(last[0]) else (float(last[0]), float(last[1]))
+    # Only "is there an unresolved loss" matters for the counters
+    pending_loss = int(prior_lost.sum()) > int(prior_reacquired.sum())
+    stats = {"lost": int(pending_loss), "reacquired": 0}
+
+    for offset, (center, lost_event, reacquired_event) in enumerate(
+        iter_tracked_frames(video_path, args, chunk_start, chunk_end, previous, stats)
+    ):
+        if offset >= len(chunk_positions):
+            break
+        row = (np.nan, np.nan) if center is None else center
+        agrees = (
+            center is not None
+            and tuple(chunk_positions[offset]) == tuple(row)
+            and chunk_lost[offset] == lost_event
+            and chunk_reacquired[offset] == reacquired_event
+        )
+        chunk_positions[offset] = row
+        chunk_lost[offset] = lost_event
+        chunk_reacquired[offset] = reacquired_event
+        if agrees:
+            return
+
+
+def long_video_track_path(video_path, args):
+    base_name = os.path.splitext(os.path.basename(video_path))[0]
+    return os.path.join(args.output, f"{base_name}_long_video_track.npz")
+
+
+def long_video_track_key(video_path, args):
+    """Everything that changes the per-frame track; the protocol is not part of it."""
+    stat = os.stat(video_path)
+    return {
+        "source": os.path.abspath(video_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "threshold": args.threshold or DEFAULT_THRESHOLD,
+        "roi_size": getattr(args, "roi_size", None) or 0,
+    }
+
+
+def load_long_video_track(video_path, args):
+    """Return the cached per-frame track if it still matches the video and settings."""
+    path = long_video_track_path(video_path, args)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as cached:
+            video_track = {name: cached[name] for name in cached.files}
+    except (OSError, ValueError):
+        return None
+    key = long_video_track_key(video_path, args)
+    if json.loads(str(video_track["key"])) != key:
+        return None
+    return video_track
+
+
+def video_metadata(video_path):
+    """Container metadata only; no frames are decoded."""
+    if framecache.is_frame_stack(video_path):
+        frames, stack_metadata = framecache.load_frame_stack(video_path)
+        return {
+            "frame_count": len(frames),
+            "fps": stack_metadata["fps"],
+            "width": stack_metadata["width"],
+            "height": stack_metadata["height"],
+        }
+    video = cv2.VideoCapture(video_path)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    metadata = {
+        "frame_count": int(video.get(cv2.CAP_PROP_FRAME_COUNT)),
+        "fps": video.get(cv2.CAP_PROP_FPS),
+        "width": int(video.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(video.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+    }
+    video.release()
+    return metadata
+
+
+def track_long_video(video_path, args, executor=None, cancel=None):
+    """
+    Decode a long video exactly once and keep its per-frame track in
+    args.output, so onset detection and segmentation are just array slicing
+    and a changed protocol re-segments without touching the video.
+    With an executor the frames are tracked on the pool, in chunks with
+    args.split_video, and setting cancel stops it.
+    """
+    video_track = load_long_video_track(video_path, args)
+    if video_track is not None:
+        print(f"Using cached per-frame track for {os.path.basename(video_path)}")
+        return video_track
+
+    metadata = video_metadata(video_path)
+    fps = metadata["fps"]
+    if fps <= 0:
+        fps = 25.0
+    frame_count = metadata["frame_count"]
+    frame_width = metadata["width"]
+    frame_height = metadata["height"]
+
+    split = split_chunk_count(args)
+    if executor is not None:
+        if split:
+            # Build the frame cache once here rather than racing in every chunk
+            framecache.ensure_cached(video_path, args)
+        chunk_futures = submit_frame_chunks(
+            executor, video_path, args, 0, frame_count, split or 1
+        )
+        wait_all(executor, [future for _, future in chunk_futures], cancel)
+        positions, lost, reacquired = stitch_frame_chunks(
+            video_path, args, chunk_futures
+        )
+    else:
+        positions, lost, reacquired = track_frames(video_path, args, 0, frame_count)
+    video_track = {
+        "key": np.array(json.dumps(long_video_track_key(video_path, args))),
+        "positions": positions,
+        "lost": lost,
+        "reacquired": reacquired,
+        "fps": np.array(fps),
+        "frame_count": np.array(frame_count),
+        "frame_dims": np.array([frame_width, frame_height]),
+    }
+    np.savez(long_video_track_path(video_path, args), **video_track)
+    return video_track
+
+
+def track_centers(positions):
+    """Detected centers of a per-frame track slice as the list process() returns."""
+    found = positions[~np.isnan(positions[:, 0])]
+    return [(x, y) for x, y in found.tolist()]
+
+
+def track_frame_indices(positions, first_frame=0):
+    """Source frame index of each center track_centers returns."""
+    return (first_frame + np.flatnonzero(~np.isnan(positions[:, 0]))).tolist()
+
+
 # Calculate the center of rotation from tracking data
 def calculate_center(centers):
     sum_x = sum([c[0] for c in centers])
@@ -195,9 +781,20 @@ def calculate_center(centers):
 
 
 # Complete video processing function
-def process(video_path, args, start_frame=0, end_frame=None, debug_name=None):
-    video = cv2.VideoCapture(video_path)
+def process(
+    video_path,
+    args,
+    start_frame=0,
+    end_frame=None,
+    debug_name=None,
+    stats=None,
+    frame_indices=None,
+):
+    video = framecache.open_video(video_path, args)
     centers = []
+    if stats is None:
+        stats = new_tracking_stats()
+    previous = None
     frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
     fps = video.get(cv2.CAP_PROP_FPS)
     frame_width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -224,15 +821,23 @@ def process(video_path, args, start_frame=0, end_frame=None, debug_name=None):
             (frame_width, frame_height),
         )
 
+    reader = open_frame_reader(video, args, max(0, end_frame - start_frame))
+
     # Process each frame
     for frame_index in range(start_frame, end_frame):
-        read, frame = video.read()
+        read, frame = reader.read()
         if not read:
             break
         try:
-            center = detect_center(frame, args)
+            center = follow_center(frame, args, previous, stats)
+            previous = center
+            if args.video and frame.ndim == 2:
+                # Cached frames are grayscale; the debug video is color
+                frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
             if center is not None:
                 centers.append(center)
+                if frame_indices is not None:
+                    frame_indices.append(frame_index)
                 if args.video:
                     # Draw a cross on the detected center of the dot.
                     # However this isn't perfect as this function can't go subpixel,
@@ -260,32 +865,210 @@ def process(video_path, args, start_frame=0, end_frame=None, debug_name=None):
             elif args.video:
                 out.write(frame)
         except Exception as e:
-            try:
-                tk.messagebox.showerror("Error", e)
-            except:
-                print("Error: ", e)
+            # This runs in workers and on the GUI's background thread, where
+            # Tk can't be called
+            print("Error: ", e)
 
-    video.release()
+    report_frame_reader(reader, video_path)
+    reader.release()
     if args.video:
         out.release()
 
     return video_path, centers, (frame_width, frame_height)
 
 
-def fit_circle(x_coords, y_coords):
-    x_mean = np.mean(x_coords)
-    y_mean = np.mean(y_coords)
-    initial_guess = [x_mean, y_mean]
+def fit_circles(tracks, refine=True, iterations=20):
+    """
+    Fit a circle to every (x, y) track in one vectorized pass.
+
+    Taubin's algebraic fit (solved with Chernov's Newton iteration on its
+    characteristic polynomial) gives the center in closed form. With refine,
+    a few damped Newton steps then minimize the std of the distances to the
+    center, the objective fit_circle used to minimize, from both the
+    Taubin center and the centroid (where that minimize started); each track
+    keeps the lower. Tracks may differ in length.
+    Returns arrays (center_x, center_y, radius, fit_error), where radius and
+    fit_error are the mean and std of the distances to the fitted center.
+    """
+    count = len(tracks)
+    lengths = np.array([len(track_x) for track_x, _ in tracks], dtype=int)
+    n = np.maximum(lengths, 1)
+    rows = np.repeat(np.arange(count), lengths)
+    if lengths.sum():
+        x = np.concatenate([np.asarray(track_x, dtype=float) for track_x, _ in tracks])
+        y = np.concatenate([np.asarray(track_y, dtype=float) for _, track_y in tracks])
+    else:
+        x = y = np.zeros(0)
+
+    def total(values, rows=rows, count=count):
+        return np.bincount(rows, values, minlength=count)
+
+    # Work about each track's centroid
+    centroid_x, centroid_y = total(x) / n, total(y) / n
+    X = x - centroid_x[rows]
+    Y = y - centroid_y[rows]
+    Z = X * X + Y * Y
+    Mxx, Myy, Mxy = total(X * X) / n, total(Y * Y) / n, total(X * Y) / n
+    Mxz, Myz, Mzz = total(X * Z) / n, total(Y * Z) / n, total(Z * Z) / n
+    Mz = Mxx + Myy
+    cov_xy = Mxx * Myy - Mxy * Mxy
+
+    # Coefficients of Taubin's characteristic polynomial
+    A3 = 4 * Mz
+    A2 = -3 * Mz * Mz - Mzz
+    A1 = Mzz * Mz + 4 * cov_xy * Mz - Mxz * Mxz - Myz * Myz - Mz * Mz * Mz
+    A0 = (
+        Mxz * Mxz * Myy
+        + Myz * Myz * Mxx
+        - Mzz * cov_xy
+        - 2 * Mxz * Myz * Mxy
+        + Mz * Mz * cov_xy
+    )
+
+    # Newton's method from 0 converges to the smallest root
+    root = np.zeros(count)
+    value = np.full(count, np.inf)
+    active = np.ones(count, dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(20):
+            new_value = A0 + root * (A1 + root * (A2 + root * A3))
+            diverged = active & (np.abs(new_value) > np.abs(value))
+            root[diverged] = 0.0
+            active &= ~diverged
+            value = np.where(active, new_value, value)
+            slope = A1 + root * (2 * A2 + root * 3 * A3)
+            new_root = np.where(active, root - value / slope, root)
+            converged = np.abs((new_root - root) / new_root) < 1e-12
+            root = np.where(active, new_root, root)
+            active &= ~converged & np.isfinite(root)
+            if not active.any():
+                break
+        root = np.where(np.isfinite(root) & (root >= 0), root, 0.0)
+
+        det = root * root - root * Mz + cov_xy
+        center_x = (Mxz * (Myy - root) - Myz * Mxy) / det / 2
+        center_y = (Myz * (Mxx - root) - Mxz * Mxy) / det / 2
+    # Collinear or stationary tracks have no circle; use the centroid
+    degenerate = ~(np.isfinite(center_x) & np.isfinite(center_y))
+    center_x = np.where(degenerate, 0.0, center_x)
+    center_y = np.where(degenerate, 0.0, center_y)
+
+    if refine and count:
+        # Both starts refine together as one batch of 2 * count rows
+        center_x, center_y = refine_circle_centers(
+            np.concatenate([X, X]),
+            np.concatenate([Y, Y]),
+            np.concatenate([rows, rows + count]),
+            np.concatenate([n, n]),
+            np.concatenate([Mz, Mz]),
+            np.concatenate([center_x, np.zeros(count)]),
+            np.concatenate([center_y, np.zeros(count)]),
+            iterations,
+        )
+
+    d = np.hypot(X - center_x[rows], Y - center_y[rows])
+    radius = total(d) / n
+    residual = d - radius[rows]
+    fit_error = np.sqrt(total(residual * residual) / n)
+    return center_x + centroid_x, center_y + centroid_y, radius, fit_error
+
+
+def refine_circle_centers(X, Y, rows, n, Mz, center_x, center_y, iterations):
+    """
+    Levenberg-Marquardt on var(distances) over the center of each row of
+    centroid-relative points; the radius is projected out as the mean
+    distance. Rows come in two halves, one per starting center, and each
+    track gets the better of its two. The normal equations and the cost
+    reduce to a few sums per step: with u, v the unit vectors from the points
+    to the center, sum(u * d) = n * center_x because the points are centered.
+    """
+    count = len(n)
+
+    def cost(cx, cy, sum_d):
+        mean_d = sum_d / n
+        return Mz + cx * cx + cy * cy - mean_d * mean_d
+
+    cx, cy = center_x.copy(), center_y.copy()
+    dx, dy = cx[rows] - X, cy[rows] - Y
+    d = np.hypot(dx, dy)
+    current = cost(cx, cy, np.bincount(rows, d, minlength=count))
+    scale = np.sqrt(Mz) + 1e-300
+    damping = np.full(count, 1e-6)
+    live = np.ones(count, dtype=bool)
+    for _ in range(iterations):
+        keep = live[rows]
+        if not keep.all():
+            X, Y, rows, dx, dy, d = (
+                X[keep], Y[keep], rows[keep], dx[keep], dy[keep], d[keep]
+            )
+        if len(rows) == 0:
+            break
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inverse = np.where(d > 0, 1 / d, 0.0)
+        u, v = dx * inverse, dy * inverse
+        sum_d = np.bincount(rows, d, minlength=count)
+        mean_u = np.bincount(rows, u, minlength=count) / n
+        mean_v = np.bincount(rows, v, minlength=count) / n
+        sum_uu = np.bincount(rows, u * u, minlength=count)
+        sum_uv = np.bincount(rows, u * v, minlength=count)
+        sum_vv = np.bincount(rows, v * v, minlength=count)
+        a = sum_uu - n * mean_u * mean_u
+        b = sum_uv - n * mean_u * mean_v
+        c = sum_vv - n * mean_v * mean_v
+        gx = n * cx - mean_u * sum_d
+        gy = n * cy - mean_v * sum_d
+        # Exact Hessian: the sum of (d - mean_d) times each distance's own
+        # curvature, which Gauss-Newton drops and which matters on noisy,
+        # small circles. Fall back to Gauss-Newton where it isn't convex.
+        mean_d = sum_d / n
+        full_a = a + sum_vv - mean_d * np.bincount(rows, v * v * inverse, minlength=count)
+        full_b = b - sum_uv + mean_d * np.bincount(rows, u * v * inverse, minlength=count)
+        full_c = c + sum_uu - mean_d * np.bincount(rows, u * u * inverse, minlength=count)
+        convex = (full_a > 0) & (full_a * full_c - full_b * full_b > 0)
+        a = np.where(convex, full_a, a)
+        b = np.where(convex, full_b, b)
+        c = np.where(convex, full_c, c)
+        # Marquardt scaling: damp each direction by its own curvature
+        a_damped = a * (1 + damping) + 1e-12
+        c_damped = c * (1 + damping) + 1e-12
+        det = a_damped * c_damped - b * b
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step_x = np.where(live & (det > 0), -(c_damped * gx - b * gy) / det, 0.0)
+            step_y = np.where(live & (det > 0), -(a_damped * gy - b * gx) / det, 0.0)
+        new_x, new_y = cx + step_x, cy + step_y
+        new_dx, new_dy = new_x[rows] - X, new_y[rows] - Y
+        new_d = np.hypot(new_dx, new_dy)
+        new_cost = cost(new_x, new_y, np.bincount(rows, new_d, minlength=count))
+        # Only take steps that lower the spread; otherwise damp harder
+        better = live & (new_cost < current)
+        # Done once a barely damped step is down at round-off in the track's
+        # own scale; heavy damping only shrinks the step, it isn't converged
+        settled = (np.hypot(step_x, step_y) <= 1e-9 * scale) & (damping < 1)
+        cx = np.where(better, new_x, cx)
+        cy = np.where(better, new_y, cy)
+        current = np.where(better, new_cost, current)
+        damping = np.where(better, damping / 10, damping * 10)
+        live &= ~settled & (damping < 1e6)
+        # The accepted trial's distances are the next step's
+        taken = better[rows]
+        dx = np.where(taken, new_dx, dx)
+        dy = np.where(taken, new_dy, dy)
+        d = np.where(taken, new_d, d)
+
+    half = count // 2
+    use_centroid = current[half:] < current[:half]
+    return (
+        np.where(use_centroid, cx[half:], cx[:half]),
+        np.where(use_centroid, cy[half:], cy[:half]),
+    )
 
-    def objective_function(center, x, y):
-        return np.std(np.sqrt((x - center[0]) ** 2 + (y - center[1]) ** 2))
 
-    result = minimize(objective_function, initial_guess, args=(x_coords, y_coords))
-    center_x, center_y = result.x
-    distances = np.sqrt((x_coords - center_x) ** 2 + (y_coords - center_y) ** 2)
-    radius = np.mean(distances)
-    fit_error = np.std(distances)
-    return (center_x, center_y, radius, fit_error)
+def fit_circle(x_coords, y_coords, refine=True):
+    center_x, center_y, radius, fit_error = fit_circles(
+        [(np.asarray(x_coords, dtype=float), np.asarray(y_coords, dtype=float))],
+        refine=refine,
+    )
+    return (center_x[0], center_y[0], radius[0], fit_error[0])
 
 
 def plot(num, video_name, centers, args, video_dims=(100, 100), title_prefix=None):
@@ -295,7 +1078,9 @@ def plot(num, video_name, centers, args, video_dims=(100, 100), title_prefix=Non
 
     center_x, center_y, radius, fit_error = fit_circle(x_coords, y_coords)
 
-    fig, ax = plt.subplots()
+    # A bare Figure, not pyplot, so this is safe off the GUI's main thread
+    fig = Figure()
+    ax = fig.subplots()
     center_x, center_y = calculate_center(centers)
 
     if args.absolute:
@@ -375,8 +1160,16 @@ def plot(num, video_name, centers, args, video_dims=(100, 100), title_prefix=Non
     ax.set_aspect("equal", "box")
     ax.plot(x_coords, y_coords, c="blue", label="Bead Path", linewidth=0.5)
 
-    plt.tight_layout()
-    plt.savefig(f"{args.output}/{video_name}_plot.png")
+    fig.tight_layout()
+    fig.savefig(f"{args.output}/{video_name}_plot.png")
+
+
+def rotation_angles(x, y, center_of_rotation):
+    """Angle of each point around the center of rotation, in [0, 360) degrees."""
+    angles = np.degrees(
+        np.arctan2(y - center_of_rotation[1], x - center_of_rotation[0])
+    )
+    return np.where(angles >= 0, angles, 360 + angles)
 
 
 def save_to_text(video_name, centers, args):
@@ -384,17 +1177,13 @@ def save_to_text(video_name, centers, args):
 
     center_of_rotation = calculate_center(centers)
 
-    # Calculate the angles using the center of rotation
-    df["Angle (deg)"] = np.degrees(
-        np.arctan2(
-            df["Y Position (px)"] - center_of_rotation[1],
-            df["X Position (px)"] - center_of_rotation[0],
-        )
+    # Calculate the angles using the center of rotation, normalized to [0, 360)
+    df["Angle (deg)"] = rotation_angles(
+        df["X Position (px)"].to_numpy(),
+        df["Y Position (px)"].to_numpy(),
+        center_of_rotation,
     )
 
-    # Normalize the angle values to be in the range of [0, 360)
-    df["Angle (deg)"] = df["Angle (deg)"].apply(lambda x: x if x >= 0 else 360 + x)
-
     df.insert(0, "Frames", range(1, len(df) + 1))
 
     df_string = df.to_string(index=False, justify="left")
@@ -404,11 +1193,231 @@ def save_to_text(video_name, centers, args):
         f.write(df_string)
 
 
+def save_to_npz(video_name, centers, args, source, frame_indices=None, segment=None):
+    """
+    Binary counterpart of save_to_text: the same columns as typed arrays
+    plus run metadata. analyze.py reads these in preference to the .txt.
+    segment is (segment_index, kind, freq_hz) for long-video segments.
+    """
+    points = np.array(centers, dtype=float).reshape(-1, 2)
+    center_of_rotation = calculate_center(centers)
+    try:
+        fps = video_metadata(source)["fps"]
+    except ValueError:
+        fps = np.nan
+    segment_index, segment_kind, segment_freq_hz = segment or (-1, "", None)
+    np.savez(
+        f"{args.output}/{video_name}.npz",
+        frame=np.arange(1, len(points) + 1, dtype=np.int32),
+        source_frame=np.asarray(
+            frame_indices if frame_indices is not None else [], dtype=np.int64
+        ),
+        x=points[:, 0],
+        y=points[:, 1],
+        angle=rotation_angles(points[:, 0], points[:, 1], center_of_rotation),
+        fps=np.float64(fps),
+        threshold=np.int32(args.threshold or DEFAULT_THRESHOLD),
+        source=np.array(os.path.abspath(source)),
+        segment_index=np.int32(segment_index),
+        segment_kind=np.array(segment_kind),
+        segment_freq_hz=np.float64(np.nan if segment_freq_hz is None else segment_freq_hz),
+    )
+
+
+def parse_thresholds(text):
+    """Parse "150:200:5" (inclusive range) or "150,160,175" into a list."""
+    if ":" in text:
+        parts = [int(p) for p in text.split(":")]
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Threshold range must be start:stop[:step], got {text}")
+        step = parts[2] if len(parts) == 3 else 1
+        if step <= 0:
+            raise ValueError("Threshold step must be positive")
+        thresholds = list(range(parts[0], parts[1] + 1, step))
+    else:
+        thresholds = [int(p) for p in text.split(",") if p.strip()]
+    if not thresholds or not all(0 <= t <= 255 for t in thresholds):
+        raise ValueError("Thresholds must be between 0 and 255")
+    return thresholds
+
+
+def sweep_thresholds(video_path, thresholds, args):
+    """
+    Decode and blur every frame once and evaluate every threshold on the
+    same blurred frame. Returns a list of per-threshold dicts with the
+    detection rate, jitter (RMS second difference of consecutive detections,
+    px) and the circle-fit error of the resulting track.
+    """
+    video = framecache.open_video(video_path, args)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    reader = open_frame_reader(video, args, frame_count)
+
+    centers = [[] for _ in thresholds]
+    frames = 0
+    while True:
+        read, frame = reader.read()
+        if not read:
+            break
+        frames += 1
+        blur = cv2.GaussianBlur(to_gray(frame), (9, 9), 2, 2)
+        for found, threshold in zip(centers, thresholds):
+            center = center_from_blur(blur, threshold)
+            if center is not None:
+                found.append(center)
+    report_frame_reader(reader, video_path)
+    reader.release()
+
+    # One batched circle fit for every threshold's track
+    points = [np.array(found, dtype=float).reshape(-1, 2) for found in centers]
+    fit_errors = fit_circles([(p[:, 0], p[:, 1]) for p in points])[3]
+
+    results = []
+    for found, threshold, fit_error in zip(points, thresholds, fit_errors):
+        result = {
+            "threshold": threshold,
+            "frames": frames,
+            "detected": len(found),
+            "detection_rate": len(found) / frames if frames else 0.0,
+            "jitter_px": np.nan,
+            "fit_error_px": np.nan,
+        }
+        if len(found) >= 3:
+            second_diff = np.diff(found, n=2, axis=0)
+            result["jitter_px"] = float(np.sqrt(np.mean(np.sum(second_diff**2, axis=1))))
+            result["fit_error_px"] = float(fit_error)
+        results.append(result)
+    return results
+
+
+def best_threshold(results):
+    """
+    Among thresholds detecting at least 95% as often as the best one, pick
+    the lowest circle-fit error (ties broken by jitter).
+    """
+    best_rate = max(r["detection_rate"] for r in results)
+    candidates = [
+        r
+        for r in results
+        if r["detection_rate"] >= 0.95 * best_rate and not np.isnan(r["fit_error_px"])
+    ]
+    if not candidates:
+        return max(results, key=lambda r: r["detection_rate"])["threshold"]
+    return min(candidates, key=lambda r: (r["fit_error_px"], r["jitter_px"]))["threshold"]
+
+
+def save_sweep(path, results):
+    df = pd.DataFrame(results)
+    df.columns = [
+        "Threshold",
+        "Frames",
+        "Detected",
+        "Detection Rate",
+        "Jitter (px)",
+        "Fit Error (px)",
+    ]
+    with open(path, "w") as f:
+        f.write(df.to_string(index=False, justify="left"))
+        f.write("\n")
+
+
+def sweep_folder(args, progress=None, cancel=None):
+    """
+    Run sweep_thresholds over args.input (file or folder), write one table
+    per video plus a batch table averaged over videos, and report the best
+    threshold for the batch.
+    """
+    thresholds = parse_thresholds(args.sweep)
+    os.makedirs(args.output, exist_ok=True)
+    if os.path.isfile(args.input):
+        video_files = [args.input]
+    else:
+        video_files = list_videos(args.input)
+    if progress is not None:
+        progress.reset(total=len(video_files))
+
+    per_video = []
+    with ProcessPoolExecutor() as executor:
+        future_to_video = {
+            executor.submit(sweep_thresholds, video_file, thresholds, args): video_file
+            for video_file in video_files
+        }
+        for future in iter_completed(executor, future_to_video, cancel):
+            video_file = future_to_video[future]
+            if progress is not None:
+                progress.update(1)
+            try:
+                results = future.result()
+            except Exception as exc:
+                print(f"{video_file} generated an exception: {exc}")
+                continue
+            video_name = os.path.splitext(os.path.basename(video_file))[0]
+            save_sweep(
+                os.path.join(args.output, f"{video_name}_threshold_sweep.txt"), results
+            )
+            per_video.append(results)
+
+    if not per_video:
+        print("No videos could be swept.")
+        return None
+
+    batch = []
+    for index, threshold in enumerate(thresholds):
+        rows = [results[index] for results in per_video]
+        batch.append(
+            {
+                "threshold": threshold,
+                "frames": sum(r["frames"] for r in rows),
+                "detected": sum(r["detected"] for r in rows),
+                "detection_rate": float(np.mean([r["detection_rate"] for r in rows])),
+                "jitter_px": float(np.nanmean([r["jitter_px"] for r in rows]))
+                if not all(np.isnan(r["jitter_px"]) for r in rows)
+                else np.nan,
+                "fit_error_px": float(np.nanmean([r["fit_error_px"] for r in rows]))
+                if not all(np.isnan(r["fit_error_px"]) for r in rows)
+                else np.nan,
+            }
+        )
+    save_sweep(os.path.join(args.output, "threshold_sweep.txt"), batch)
+    best = best_threshold(batch)
+    print(f"Best threshold for {len(per_video)} video(s): {best}")
+    return best
+
+
 def process_video(num, video_file, args, output_name=None, title_prefix=None):
-    video_path, centers, video_dims = process(video_file, args)
+    stats = new_tracking_stats()
+    frame_indices = []
+    video_path, centers, video_dims = process(
+        video_file, args, stats=stats, frame_indices=frame_indices
+    )
+    if getattr(args, "roi_size", None):
+        print(f"{os.path.basename(video_file)}: {format_tracking_stats(stats)}")
+
+    return export_video(
+        num,
+        video_path,
+        centers,
+        video_dims,
+        args,
+        output_name,
+        title_prefix,
+        frame_indices=frame_indices,
+    )
 
+
+def export_video(
+    num,
+    video_path,
+    centers,
+    video_dims,
+    args,
+    output_name=None,
+    title_prefix=None,
+    frame_indices=None,
+):
     if not centers:
-        print(f"No bead detected in {video_file}.")
+        print(f"No bead detected in {video_path}.")
         return video_path, None, None
 
     video_name = output_name or os.path.splitext(os.path.basename(video_path))[0]
@@ -422,30 +1431,267 @@ def process_video(num, video_file, args, output_name=None, title_prefix=None):
         # Save the results to a text file
         save_to_text(video_name, centers, args)
 
+    if getattr(args, "npz", False):
+        save_to_npz(video_name, centers, args, video_path, frame_indices)
+
     return video_path, centers, center_of_rotation
 
 
-def process_long_video(video_path, args, progress=None):
-    """Split a long video by timer from bead movement onset and track each segment."""
-    if args.output is None:
-        args.output = os.path.join(os.getcwd(), "output")
-    os.makedirs(args.output, exist_ok=True)
+def bead_window(center, frame_shape, size=BEAD_WINDOW):
+    """(x1, y1, x2, y2) of the window around a bead, clipped to the frame."""
+    cx, cy = center
+    half = size // 2
+    return (
+        max(0, cx - half),
+        max(0, cy - half),
+        min(cx + half, frame_shape[1]),
+        min(cy + half, frame_shape[0]),
+    )
 
-    segments = resolve_long_video_segments(args)
 
-    start_frame, start_time = detect_movement_start(video_path, args)
+def track_beads(video_path, args, bead_centers):
+    """
+    Track several beads in one full-field video with a single decode. Each
+    frame is cut into a window per bead and every window keeps its own
+    detector state, as if it were a cropped video of its own. Returns one
+    (centers, frame_indices, window, stats) per bead, centers in window
+    coordinates.
+    """
+    video = framecache.open_video(video_path, args)
+    if not video.isOpened():
+        raise ValueError(f"Could not open video: {video_path}")
+    frame_count = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    beads = [
+        {"centers": [], "frame_indices": [], "previous": None, "stats": new_tracking_stats()}
+        for _ in bead_centers
+    ]
+    windows = None
+
+    reader = open_frame_reader(video, args, frame_count)
+    for frame_index in range(frame_count):
+        read, frame = reader.read()
+        if not read:
+            break
+        if windows is None:
+            windows = [bead_window(center, frame.shape) for center in bead_centers]
+        for bead, (x1, y1, x2, y2) in zip(beads, windows):
+            try:
+                center = follow_center(frame[y1:y2, x1:x2], args, bead["previous"], bead["stats"])
+            except Exception as e:
+                print("Error: ", e)
+                continue
+            bead["previous"] = center
+            if center is not None:
+                bead["centers"].append(center)
+                bead["frame_indices"].append(frame_index)
+    report_frame_reader(reader, video_path)
+    reader.release()
+
+    return [
+        (bead["centers"], bead["frame_indices"], window, bead["stats"])
+        for bead, window in zip(beads, windows or [])
+    ]
+
+
+def process_beads(num, video_file, args, bead_centers):
+    """
+    Multi-bead tracking of one video: bead i's plot and tracks go to
+    args.output/bead_i, the layout crop.export_selected_beads uses, without
+    writing a cropped video per bead.
+    """
+    results = []
+    for bead, (centers, frame_indices, window, stats) in enumerate(
+        track_beads(video_file, args, bead_centers), start=1
+    ):
+        bead_args = argparse.Namespace(
+            **dict(vars(args), output=os.path.join(args.output, f"bead_{bead}"))
+        )
+        os.makedirs(bead_args.output, exist_ok=True)
+        if getattr(args, "roi_size", None):
+            print(f"{os.path.basename(video_file)} bead {bead}: {format_tracking_stats(stats)}")
+        x1, y1, x2, y2 = window
+        results.append(
+            export_video(
+                num,
+                video_file,
+                centers,
+                (x2 - x1, y2 - y1),
+                bead_args,
+                frame_indices=frame_indices,
+            )
+        )
+    return results
+
+
+def parse_bead_centers(beads, video_file):
+    """Bead centers from --beads: "x,y" pairs, or "auto" to detect them on the first frame."""
+    if list(beads) == ["auto"]:
+        import crop
+
+        video = cv2.VideoCapture(video_file)
+        read, frame = video.read()
+        video.release()
+        if not read:
+            raise ValueError(f"Could not read a frame from {video_file}")
+        return crop.detect_beads(frame)
+    return [tuple(int(v) for v in bead.split(",")) for bead in beads]
+
+
+def process_beads_folder(args, progress=None, cancel=None):
+    """Multi-bead tracking (args.beads) of args.input, a video or a folder of them."""
+    if os.path.isfile(args.input):
+        video_files = [args.input]
+    else:
+        video_files = list_videos(args.input)
+    if args.video:
+        print("--video is ignored in multi-bead tracking.")
+        # A copy, so the caller's args keep their setting
+        args = argparse.Namespace(**vars(args))
+        args.video = False
+    if progress is not None:
+        progress.reset(total=len(video_files))
+    with ProcessPoolExecutor() as executor:
+        future_to_video = {}
+        for i, video_file in enumerate(video_files):
+            try:
+                # With "auto" this reads the video, which can fail like tracking can
+                bead_centers = parse_bead_centers(args.beads, video_file)
+            except Exception as exc:
+                print(f"{video_file} generated an exception: {exc}")
+                if progress is not None:
+                    progress.update(1)
+                continue
+            future = executor.submit(process_beads, i, video_file, args, bead_centers)
+            future_to_video[future] = video_file
+        for future in iter_completed(executor, future_to_video, cancel):
+            if progress is not None:
+                progress.update(1)
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"{future_to_video[future]} generated an exception: {exc}")
+
+
+def process_videos_split(numbered_videos, args, progress=None, cancel=None):
+    """
+    Track each video as contiguous frame chunks spread over the pool, so a
+    single large file uses every core, then stitch the chunks back in frame
+    order and export. numbered_videos is a list of (num, video_file).
+    """
+    with ProcessPoolExecutor() as executor:
+        submitted = []
+        for num, video_file in numbered_videos:
+            try:
+                metadata = video_metadata(video_file)
+                framecache.ensure_cached(video_file, args)
+            except ValueError as exc:
+                print(f"{video_file} generated an exception: {exc}")
+                if progress is not None:
+                    progress.update(1)
+                continue
+            chunk_futures = submit_frame_chunks(
+                executor, video_file, args, 0, metadata["frame_count"], split_chunk_count(args)
+            )
+            submitted.append((num, video_file, metadata, chunk_futures))
+
+        export_futures = {}
+        for num, video_file, metadata, chunk_futures in submitted:
+            wait_all(executor, [future for _, future in chunk_futures], cancel)
+            try:
+                positions, lost, reacquired = stitch_frame_chunks(
+                    video_file, args, chunk_futures
+                )
+            except Exception as exc:
+                print(f"{video_file} generated an exception: {exc}")
+                if progress is not None:
+                    progress.update(1)
+                continue
+            if getattr(args, "roi_size", None):
+                stats = {"lost": int(lost.sum()), "reacquired": int(reacquired.sum())}
+                print(f"{os.path.basename(video_file)}: {format_tracking_stats(stats)}")
+            video_dims = (metadata["width"], metadata["height"])
+            future = executor.submit(
+                export_video,
+                num,
+                video_file,
+                track_centers(positions),
+                video_dims,
+                args,
+                frame_indices=track_frame_indices(positions),
+            )
+            export_futures[future] = video_file
+
+        for future in iter_completed(executor, export_futures, cancel):
+            if progress is not None:
+                progress.update(1)
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"{export_futures[future]} generated an exception: {exc}")
+
+
+def export_segment(
+    segment_index,
+    output_name,
+    title_prefix,
+    centers,
+    video_path,
+    seg_start,
+    seg_end,
+    video_dims,
+    args,
+    frame_indices=None,
+    segment=None,
+):
+    """
+    Write one long-video segment's outputs. Runs in a pool worker.
+    segment is (segment_index, kind, freq_hz) for the binary output.
+    """
+    if args.video:
+        # Only the debug video needs frames, so the worker seeks to its own range
+        process(
+            video_path,
+            args,
+            start_frame=seg_start,
+            end_frame=seg_end,
+            debug_name=output_name,
+        )
+
+    if not centers:
+        print(f"No bead detected in segment {segment_index} ({output_name}).")
+        return output_name
+    if args.plot:
+        plot(
+            segment_index,
+            output_name,
+            centers,
+            args,
+            video_dims,
+            title_prefix=title_prefix,
+        )
+    if args.text:
+        save_to_text(output_name, centers, args)
+    if getattr(args, "npz", False):
+        save_to_npz(output_name, centers, args, video_path, frame_indices, segment)
+    return output_name
+
+
+def write_long_video_manifest(video_path, args, video_track, segments):
+    """
+    Find the movement onset in a per-frame track, write the segment manifest
+    and return the export_segment argument tuples for every segment in range.
+    """
+    positions = video_track["positions"]
+    fps = float(video_track["fps"])
+    total_frames = int(video_track["frame_count"])
+    video_dims = tuple(int(d) for d in video_track["frame_dims"])
+
+    start_frame, start_time = movement_start_from_track(positions, fps)
     print(
         f"Movement detected at {start_time:.1f}s (frame {start_frame}) in "
         f"{os.path.basename(video_path)}"
     )
 
-    video = cv2.VideoCapture(video_path)
-    fps = video.get(cv2.CAP_PROP_FPS)
-    if fps <= 0:
-        fps = 25.0
-    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-    video.release()
-
     base_name = os.path.splitext(os.path.basename(video_path))[0]
     manifest_path = os.path.join(args.output, f"{base_name}_long_video_manifest.txt")
     protocol_path = os.path.join(args.output, f"{base_name}_long_video_protocol.json")
@@ -454,13 +1700,7 @@ def process_long_video(video_path, args, progress=None):
     elif getattr(args, "protocol_file", None):
         protocol_path = args.protocol_file
 
-    if progress is not None:
-        try:
-            progress.reset(total=len(segments))
-            progress._tk_window.deiconify()
-        except Exception:
-            pass
-
+    jobs = []
     with open(manifest_path, "w") as manifest:
         manifest.write(f"source_video={video_path}\n")
         manifest.write(f"movement_start_frame={start_frame}\n")
@@ -479,8 +1719,6 @@ def process_long_video(video_path, args, progress=None):
                 manifest.write(
                     f"segment={segment_index:02d} status=skipped reason=beyond_video_end\n"
                 )
-                if progress is not None:
-                    progress.update(1)
                 continue
 
             output_name = segment_output_name(base_name, segment_index, kind, freq_hz)
@@ -491,32 +1729,65 @@ def process_long_video(video_path, args, progress=None):
                 f"start_frame={seg_start} end_frame={min(seg_end, total_frames)} "
                 f"output={output_name}\n"
             )
+            if getattr(args, "roi_size", None):
+                stats = {
+                    "lost": int(video_track["lost"][seg_start:seg_end].sum()),
+                    "reacquired": int(
+                        video_track["reacquired"][seg_start:seg_end].sum()
+                    ),
+                }
+                manifest.write(
+                    f"segment={segment_index:02d} {format_tracking_stats(stats)}\n"
+                )
 
-            _, centers, video_dims = process(
-                video_path,
-                args,
-                start_frame=seg_start,
-                end_frame=seg_end,
-                debug_name=output_name if args.video else None,
+            jobs.append(
+                (
+                    segment_index,
+                    output_name,
+                    title_prefix,
+                    track_centers(positions[seg_start:seg_end]),
+                    video_path,
+                    seg_start,
+                    seg_end,
+                    video_dims,
+                    args,
+                    track_frame_indices(positions[seg_start:seg_end], seg_start),
+                    (segment_index, kind, freq_hz),
+                )
             )
 
-            if not centers:
-                print(f"No bead detected in segment {segment_index} ({output_name}).")
-            else:
-                if args.plot:
-                    plot(
-                        segment_index,
-                        output_name,
-                        centers,
-                        args,
-                        video_dims,
-                        title_prefix=title_prefix,
-                    )
-                if args.text:
-                    save_to_text(output_name, centers, args)
+    print(f"Wrote segment manifest to {manifest_path}")
+    return jobs
 
-            if progress is not None:
-                progress.update(1)
+
+def process_long_video(video_path, args, progress=None, executor=None, cancel=None):
+    """
+    Split a long video by timer from bead movement onset and export each segment.
+    The video is tracked once (see track_long_video); onset detection and the
+    segments are slices of that per-frame track. Segment exports (plots, text
+    and debug videos) are spread over a worker pool.
+    """
+    if args.output is None:
+        args.output = os.path.join(os.getcwd(), "output")
+    os.makedirs(args.output, exist_ok=True)
+
+    if executor is None:
+        with ProcessPoolExecutor() as executor:
+            process_long_video(video_path, args, progress, executor, cancel)
+        return
+
+    segments = resolve_long_video_segments(args)
+    video_track = track_long_video(video_path, args, executor, cancel)
+    jobs = write_long_video_manifest(video_path, args, video_track, segments)
+
+    if progress is not None:
+        try:
+            progress.reset(total=len(jobs))
+            progress._tk_window.deiconify()
+        except Exception:
+            pass
+
+    export_segments(executor, jobs, progress, cancel)
 
     if progress is not None:
         try:
@@ -526,66 +1797,272 @@ def process_long_video(video_path, args, progress=None):
         except Exception:
             pass
 
-    print(f"Wrote segment manifest to {manifest_path}")
+
+def export_segments(executor, jobs, progress=None, cancel=None):
+    future_to_segment = {executor.submit(export_segment, *job): job[1] for job in jobs}
+    for future in iter_completed(executor, future_to_segment, cancel):
+        if progress is not None:
+            progress.update(1)
+        try:
+            future.result()
+        except Exception as exc:
+            print(f"{future_to_segment[future]} generated an exception: {exc}")
+
+
+def process_long_video_folder(video_files, args, progress=None, cancel=None):
+    """
+    Track several long videos concurrently, then export all of their
+    segments through the same pool as soon as each track is ready.
+    """
+    os.makedirs(args.output, exist_ok=True)
+    segments = resolve_long_video_segments(args)
+    if progress is not None:
+        progress.reset(total=len(video_files))
+
+    with ProcessPoolExecutor() as executor:
+        track_futures = {
+            executor.submit(track_long_video, video_file, args): video_file
+            for video_file in video_files
+        }
+        export_futures = {}
+        pending = {}
+        for future in iter_completed(executor, track_futures, cancel):
+            video_file = track_futures[future]
+            try:
+                video_track = future.result()
+                jobs = write_long_video_manifest(video_file, args, video_track, segments)
+            except Exception as exc:
+                print(f"{video_file} generated an exception: {exc}")
+                if progress is not None:
+                    progress.update(1)
+                continue
+            pending[video_file] = len(jobs)
+            if not jobs and progress is not None:
+                progress.update(1)
+            for job in jobs:
+                export_futures[executor.submit(export_segment, *job)] = (
+                    video_file,
+                    job[1],
+                )
+
+        for future in iter_completed(executor, export_futures, cancel):
+            video_file, output_name = export_futures[future]
+            try:
+                future.result()
+            except Exception as exc:
+                print(f"{output_name} generated an exception: {exc}")
+            pending[video_file] -= 1
+            if pending[video_file] == 0 and progress is not None:
+                progress.update(1)
+
+
+def split_chunk_count(args):
+    """Number of frame chunks per video for --split-video (0 means one per core)."""
+    chunks = getattr(args, "split_video", None)
+    if chunks is None:
+        return None
+    return chunks or os.cpu_count() or 1
+
+
+def list_videos(folder):
+    """Sorted paths of the .avi/.mp4 videos and lossless frame stacks in a folder."""
+    paths = (os.path.join(folder, f) for f in os.listdir(folder))
+    return sorted(
+        path
+        for path in paths
+        if path.endswith(".avi") or path.endswith(".mp4") or framecache.is_frame_stack(path)
+    )
+
+
+def video_cost(video_file):
+    """Frames x pixels from container metadata, which tracking time scales with."""
+    try:
+        metadata = video_metadata(video_file)
+    except ValueError:
+        return 0
+    return metadata["frame_count"] * metadata["width"] * metadata["height"]
+
+
+def longest_first(numbered_videos):
+    """(num, video_file) pairs ordered by estimated cost, largest first."""
+    costs = {video_file: video_cost(video_file) for _, video_file in numbered_videos}
+    return sorted(numbered_videos, key=lambda pair: costs[pair[1]], reverse=True)
+
+
+class Cancelled(Exception):
+    """A run's cancel event stopped it before its jobs finished."""
+
+
+def submit_bounded(executor, fn, jobs, max_pending, cancel=None):
+    """
+    Submit fn(*job) for each job, never more than max_pending at a time, and
+    yield (job, future) as they finish. Setting the cancel event stops
+    submitting, terminates the jobs still running and raises Cancelled.
+    """
+    jobs = iter(jobs)
+    pending = {}
+    for job in jobs:
+        pending[executor.submit(fn, *job)] = job
+        if len(pending) >= max_pending:
+            break
+    while pending:
+        if cancel is not None and cancel.is_set():
+            terminate_workers(executor)
+            raise Cancelled()
+        timeout = None if cancel is None else CANCEL_POLL_SEC
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            job = pending.pop(future)
+            next_job = next(jobs, None)
+            if next_job is not None:
+                pending[executor.submit(fn, *next_job)] = next_job
+            yield job, future
+
+
+def iter_completed(executor, futures, cancel=None):
+    """
+    as_completed that, once cancel is set, terminates the pool's workers and
+    raises Cancelled.
+    """
+    if cancel is None:
+        yield from as_completed(futures)
+        return
+    pending = set(futures)
+    while pending:
+        if cancel.is_set():
+            terminate_workers(executor)
+            raise Cancelled()
+        done, pending = wait(pending, timeout=CANCEL_POLL_SEC, return_when=FIRST_COMPLETED)
+        yield from done
+
+
+def wait_all(executor, futures, cancel=None):
+    """Wait for every future; raises Cancelled if cancel is set first."""
+    for _ in iter_completed(executor, futures, cancel):
+        pass
+
+
+def terminate_workers(executor):
+    """Drop a pool's queued jobs and kill the worker processes running the rest."""
+    # shutdown() forgets the worker processes, so take them first
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join()
+
+
+def find_onsets(args):
+    """Print the movement onset of every video in args.input without tracking."""
+    if os.path.isfile(args.input):
+        video_files = [args.input]
+    else:
+        video_files = list_videos(args.input)
+    for video_file in video_files:
+        start_frame, start_time = detect_movement_start(video_file, args)
+        print(
+            f"Movement detected at {start_time:.1f}s (frame {start_frame}) in "
+            f"{os.path.basename(video_file)}"
+        )
+
+
+def use_split_video(args):
+    if split_chunk_count(args) is None:
+        return False
+    if args.video:
+        # The annotated video has to be written in frame order by one writer
+        print("--split-video is ignored when exporting annotated videos.")
+        return False
+    return True
+
+
+def process_folder(args, progress=None, cancel=None):
+    """
+    Track args.input, a video or a folder of them. Setting the cancel event
+    (a threading.Event) stops the run early and terminates its workers.
+    Returns False if it was stopped before finishing, True otherwise.
+    """
+    try:
+        process_input(args, progress, cancel)
+    except Cancelled:
+        return False
+    return True
 
 
-def process_folder(args, progress=None):
+def process_input(args, progress=None, cancel=None):
+    """process_folder's work; raises Cancelled when cancel stops it."""
     if args.output is None:
         args.output = os.path.join(os.getcwd() + "/output")
 
+    if getattr(args, "sweep", None):
+        sweep_folder(args, progress, cancel)
+        return
+
+    if getattr(args, "find_onset", False):
+        find_onsets(args)
+        return
+
+    if getattr(args, "beads", None):
+        process_beads_folder(args, progress, cancel)
+        return
+
     # Check if input is file or folder
     if os.path.isfile(args.input):
         if getattr(args, "long_video", False):
-            process_long_video(args.input, args, progress)
+            process_long_video(args.input, args, progress, cancel=cancel)
+        elif use_split_video(args):
+            process_videos_split([(None, args.input)], args, cancel=cancel)
         else:
-            process_video(None, args.input, args)
+            # On a worker so that cancelling can stop it mid-video
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                future = executor.submit(process_video, None, args.input, args)
+                wait_all(executor, [future], cancel)
+                future.result()
 
     elif os.path.isdir(args.input):
         if getattr(args, "long_video", False):
-            video_files = sorted(
-                os.path.join(args.input, f)
-                for f in os.listdir(args.input)
-                if f.endswith(".avi") or f.endswith(".mp4")
-            )
-            if progress is not None:
-                progress.reset(total=len(video_files))
-            for video_file in video_files:
-                process_long_video(video_file, args, progress)
+            video_files = list_videos(args.input)
+            process_long_video_folder(video_files, args, progress, cancel)
             return
-        video_files = [
-            os.path.join(args.input, f)
-            for f in os.listdir(args.input)
-            if f.endswith(".avi") or f.endswith(".mp4")
-        ]
+        video_files = list_videos(args.input)
         if progress is None:
             from tqdm import tqdm
 
             progress = tqdm(total=len(video_files), desc="Overall Progress", unit="video")
         progress.reset(total=len(video_files))
-        # Sort the video files:
         try:
             progress._tk_window.deiconify()
         except:
             pass
 
+        if use_split_video(args):
+            process_videos_split(list(enumerate(video_files)), args, progress, cancel)
+            progress.n = progress.total
+            progress.refresh()
+            try:
+                progress._tk_window.withdraw()
+            except:
+                pass
+            return
 
-        video_files.sort()
-        with ProcessPoolExecutor() as executor:
-            # Map futures to video file names
-            future_to_video = {
-                executor.submit(process_video, i, video_file, args): video_file
-                for i, video_file in enumerate(video_files)
-            }
-
-            for future in as_completed(future_to_video):
+        numbered_videos = list(enumerate(video_files))
+        if getattr(args, "longest_first", False):
+            # Start the longest videos first so none is left running alone at the end
+            numbered_videos = longest_first(numbered_videos)
+        workers = os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = ((i, video_file, args) for i, video_file in numbered_videos)
+            for (_, video_file, _), future in submit_bounded(
+                executor, process_video, jobs, 2 * workers, cancel
+            ):
                 # Update the progress bar manually
                 progress.update(1)
 
                 try:
                     result = future.result()
                 except Exception as exc:
-                    video_name = future_to_video[future]
-                    print(f"{video_name} generated an exception: {exc}")
+                    print(f"{video_file} generated an exception: {exc}")
 
             # Finish the progress bar
             progress.n = progress.total
@@ -625,6 +2102,12 @@ if __name__ == "__main__":
         action="store_true",
         help="Export only position plots for visualization purposes",
     )
+    parser.add_argument(
+        "-n",
+        "--npz",
+        action="store_true",
+        help="Also export binary .npz tracks (read by analyze.py in preference to .txt)",
+    )
     parser.add_argument(
         "input", type=str, help="Path to the folder containing video files."
     )
@@ -652,6 +2135,73 @@ if __name__ == "__main__":
         default=None,
         help="JSON file defining long-video precess/hold steps.",
     )
+    parser.add_argument(
+        "--roi-size",
+        type=int,
+        default=None,
+        help="Follow the bead with a search window of this size (px) instead "
+        "of searching the full frame every frame.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=int,
+        default=None,
+        help="Decode frames on a background thread with a queue this deep "
+        "(e.g. 8) and report whether runs are decode- or detect-bound.",
+    )
+    parser.add_argument(
+        "--find-onset",
+        action="store_true",
+        help="Only report where bead movement starts in each video.",
+    )
+    parser.add_argument(
+        "--onset-coarse",
+        type=int,
+        default=None,
+        help="Scan for the onset every N samples first, then densely around it.",
+    )
+    parser.add_argument(
+        "--sweep",
+        type=str,
+        default=None,
+        help="Instead of tracking, evaluate thresholds given as start:stop[:step] "
+        "or a comma list in a single decode pass and report the best one.",
+    )
+    parser.add_argument(
+        "--frame-cache",
+        type=str,
+        nargs="?",
+        const=framecache.DEFAULT_CACHE_DIR,
+        default=None,
+        help="Keep decoded grayscale frames in this folder and reuse them on "
+        f"later runs (default {framecache.DEFAULT_CACHE_DIR}, shared with the GUI).",
+    )
+    parser.add_argument(
+        "--frame-cache-size",
+        type=float,
+        default=framecache.DEFAULT_CACHE_SIZE_GB,
+        help="Frame cache size cap in GB; least recently used videos are evicted.",
+    )
+    parser.add_argument(
+        "--split-video",
+        type=int,
+        default=None,
+        help="Track each video as this many frame chunks in parallel "
+        "(0: one per CPU core).",
+    )
+    parser.add_argument(
+        "--beads",
+        nargs="+",
+        default=None,
+        metavar="X,Y",
+        help="Track several beads per full-field video in one decode: their "
+        "centers as X,Y pixel pairs, or 'auto' to detect them.",
+    )
+    parser.add_argument(
+        "--longest-first",
+        action="store_true",
+        help="Track a folder's videos in order of frames x pixels, largest first.",
+    )
     args = parser.parse_args()
 
     process_folder(args, None)